@@ -0,0 +1,229 @@
+# api.py (Read-only JSON API over the cached aggregates, forecasts and anomalies)
+#
+# Usage: python api.py --port 8050
+#
+#   GET /totals?start=2025-03-01&end=2025-03-07&modes=bus,tram
+#   GET /daily?start=...&end=...&modes=...
+#   GET /breakdown/transport_mode   (or /breakdown/user_id), same filters
+#   GET /forecast?days=7            plus the filters
+#   GET /anomalies?engine=ewma      plus the filters
+#   GET /health
+#
+# Data is loaded through the emission cache once per version of the source
+# file (its fingerprint); responses are cached per version and query, carry an
+# ETag and answer If-None-Match with 304. Identical requests that arrive while
+# a result is being computed wait for that computation instead of repeating it.
+
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+import pandas as pd
+from aiohttp import web
+from emission_cache import fingerprint
+from emission_index import EmissionIndex
+from rollup import filter_rollup, load_rollup, totals_by
+from trip_store import resolve_data_file
+
+CACHE_ENTRIES = 256
+CHECK_INTERVAL = 1.0  # seconds between fingerprint checks of the source file
+BREAKDOWN_COLUMNS = ('transport_mode', 'user_id')
+
+
+# Everything derived from one version of the source file
+class DataVersion:
+    def __init__(self, source, version):
+        self.version = version
+        # Goes through the Parquet emission cache, so only new trips are parsed
+        self.rollup = load_rollup(source)
+        self.index = EmissionIndex(self.rollup)
+
+
+def _filters(query):
+    start = pd.Timestamp(query['start'], tz='UTC') if query.get('start') else None
+    end = pd.Timestamp(query['end'], tz='UTC') if query.get('end') else None
+    modes = [mode for mode in query['modes'].split(',') if mode] if query.get('modes') else None
+    return start, end, modes
+
+
+def _records(df, date_column):
+    out = df.reset_index()
+    out[date_column] = out[date_column].dt.strftime('%Y-%m-%d')
+    return out.to_dict(orient='records')
+
+
+def totals(data, query):
+    start, end, modes = _filters(query)
+    span = data.index.span(start, end, modes)
+    return {
+        'total_kg': data.index.total(start, end, modes),
+        'last_7_days_kg': data.index.recent_total(7, start, end, modes),
+        'days': 0 if span is None else span[1] - span[0] + 1,
+        'modes': data.index.modes_in(start, end) if modes is None else modes
+    }
+
+
+def daily(data, query):
+    return _records(data.index.daily(*_filters(query)), 'datetime')
+
+
+def breakdown(data, query, column):
+    if column not in BREAKDOWN_COLUMNS:
+        raise web.HTTPNotFound(text=f"breakdown by one of {', '.join(BREAKDOWN_COLUMNS)}")
+    start, end, modes = _filters(query)
+    if column == 'transport_mode':
+        series = data.index.totals_by_mode(start, end, modes)
+    else:
+        series = totals_by(filter_rollup(data.rollup, start, end, modes), column)
+    return {str(key): value for key, value in series.items()}
+
+
+def forecast(data, query):
+    from forecaster import PersistentForecaster
+    days = int(query.get('days', 7))
+    history = data.index.daily(*_filters(query))
+    _, result = PersistentForecaster('api').forecast(history, days=days)
+    result = result[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(days)
+    result['ds'] = result['ds'].dt.strftime('%Y-%m-%d')
+    return result.to_dict(orient='records')
+
+
+def anomalies(data, query):
+    from time_series import ANOMALY_ENGINES, detect_anomalies
+    engine = query.get('engine', 'isolation_forest')
+    if engine not in ANOMALY_ENGINES:
+        raise web.HTTPBadRequest(text=f"unknown engine {engine!r}; choose from {sorted(ANOMALY_ENGINES)}")
+    history = data.index.daily(*_filters(query))
+    return _records(detect_anomalies(history, engine=engine, name='api'), 'datetime')
+
+
+class QueryService:
+    def __init__(self, source, cache_entries=CACHE_ENTRIES):
+        self.source = source
+        self.cache_entries = cache_entries
+        self._data = None
+        self._loading = None
+        self._checked = 0.0
+        self._results = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # Current data version; reloaded (once, however many requests are waiting)
+    # when the source fingerprint has changed
+    async def data(self):
+        loop = asyncio.get_running_loop()
+        if self._data is not None and loop.time() - self._checked < CHECK_INTERVAL:
+            return self._data
+        version = await loop.run_in_executor(None, fingerprint, self.source)
+        self._checked = loop.time()
+        if self._data is not None and self._data.version == version:
+            return self._data
+        if self._loading is None:
+            self._loading = loop.run_in_executor(None, DataVersion, self.source, version)
+        loading = self._loading
+        try:
+            data = await loading
+        finally:
+            if self._loading is loading:
+                self._loading = None
+        if self._data is None or self._data.version != data.version:
+            self._data = data
+            self._results.clear()
+        return self._data
+
+    # (etag, body) for one endpoint and query, computed at most once per data version
+    async def result(self, name, func, query, *args):
+        data = await self.data()
+        key = (data.version, name, args, tuple(sorted(query.items())))
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            payload = await asyncio.get_running_loop().run_in_executor(None, func, data, query, *args)
+            body = json.dumps({'version': data.version, 'data': payload}, default=str).encode()
+            cached = (hashlib.sha1(body).hexdigest(), body)
+            self._results[key] = cached
+            while len(self._results) > self.cache_entries:
+                self._results.popitem(last=False)
+            future.set_result(cached)
+            return cached
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when no one else was waiting
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                'cached_results': len(self._results)}
+
+
+SERVICE = web.AppKey('service', QueryService)
+
+
+def _respond(request, etag, body):
+    quoted = f'"{etag}"'
+    if request.headers.get('If-None-Match') == quoted:
+        return web.Response(status=304, headers={'ETag': quoted})
+    return web.Response(body=body, content_type='application/json', headers={'ETag': quoted})
+
+
+def create_app(source=None):
+    service = QueryService(source or resolve_data_file())
+    routes = web.RouteTableDef()
+
+    def endpoint(path, func):
+        @routes.get(path)
+        async def handler(request):
+            args = tuple(request.match_info.values())
+            try:
+                etag, body = await service.result(path, func, dict(request.query), *args)
+            except ValueError as exc:
+                raise web.HTTPBadRequest(text=str(exc))
+            return _respond(request, etag, body)
+
+    endpoint('/totals', totals)
+    endpoint('/daily', daily)
+    endpoint('/breakdown/{column}', breakdown)
+    endpoint('/forecast', forecast)
+    endpoint('/anomalies', anomalies)
+
+    @routes.get('/health')
+    async def health(request):
+        data = await service.data()
+        return web.json_response({'source': service.source, 'version': data.version, 'cache': service.stats()})
+
+    app = web.Application()
+    app.add_routes(routes)
+    app[SERVICE] = service
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve emission aggregates, forecasts and anomalies as JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--data', default=None, help='trip store (default: data/trips.jsonl, else data/data.json)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    web.run_app(create_app(args.data), host=args.host, port=args.port)
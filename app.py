@@ -3,7 +3,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
-from time_series import load_emission_data, forecast_emissions, detect_anomalies
+from trip_store import resolve_data_file
+from emission_cache import fingerprint
+from rollup import load_rollup
+from emission_index import EmissionIndex
+from time_series import ANOMALY_ENGINES, detect_anomalies, query_emissions
+from partitions import update_partitions
+from forecaster import PersistentForecaster
+from downsample import MAX_POINTS, bucket_sum, choose_bucket, lttb
 
 st.set_page_config(page_title="BVG Emission Dashboard", layout="wide")
 
@@ -11,6 +18,9 @@ PRIMARY_BVG = "#FFD500"  # Yellow
 BLACK = "#000000"
 WHITE = "#FFFFFF"
 
+# Results kept per (data fingerprint, date range, modes); least recently used are evicted
+CACHE_ENTRIES = 32
+
 def update_plotly_layout(fig, title=""):
     fig.update_layout(
         title=dict(text=title, font=dict(color=BLACK, size=16)),
@@ -22,6 +32,34 @@ def update_plotly_layout(fig, title=""):
         margin=dict(l=50, r=50, t=60, b=50)
     )
 
+# Daily x mode x user rollup is shared across reruns until the source file changes
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_data(source, source_fingerprint):
+    rollup = load_rollup(source)
+    rollup["date"] = pd.to_datetime(rollup["date"]).dt.tz_convert("UTC")
+    return rollup
+
+# Range-query index over the rollup; every total, daily series and top-day list below comes from it
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_index(source, source_fingerprint):
+    return EmissionIndex(load_data(source, source_fingerprint))
+
+# Month partitions for trip-level queries, refreshed when the source file changes
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_partitions(source, source_fingerprint):
+    return update_partitions(source)
+
+# Model fits are memoized on the filter state; _df (the daily totals) is not hashed, the key arguments identify it
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Fitting forecast...")
+def cached_forecast(source_fingerprint, start_ts, end_ts, modes, _df):
+    forecaster = PersistentForecaster("dashboard")
+    _, forecast = forecaster.forecast(_df)
+    return forecast, forecaster.metrics
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Detecting anomalies...")
+def cached_anomalies(source_fingerprint, start_ts, end_ts, modes, engine, _df):
+    return detect_anomalies(_df, engine=engine, name="dashboard")
+
 # Dashboard title
 st.markdown(
     f"""
@@ -47,26 +85,36 @@ Key insights are provided, including:
 The dashboard helps users understand emission trends and supports climate action by forecasting future emissions, identifying peak days, and promoting emission-reducing practices.
 """)
 
-df = load_emission_data("data/data.json")
-df.index = pd.to_datetime(df.index).tz_convert("UTC")
-min_ts = df.index.min()
-max_ts = df.index.max()
+data_file = resolve_data_file()
+data_fingerprint = fingerprint(data_file)
+rollup = load_data(data_file, data_fingerprint)
+index = load_index(data_file, data_fingerprint)
+partition_dir = load_partitions(data_file, data_fingerprint)
+min_ts = rollup["date"].min()
+max_ts = rollup["date"].max()
 
 date_range = st.date_input("Select Date Range", [min_ts.date(), max_ts.date()], min_value=min_ts.date(), max_value=max_ts.date())
 start_ts = pd.Timestamp(date_range[0]).tz_localize("UTC")
 end_ts = pd.Timestamp(date_range[1]).tz_localize("UTC")
-df_filtered = df[(df.index >= start_ts) & (df.index <= end_ts)]
 
-modes = df_filtered["transport_mode"].unique().tolist()
+modes = index.modes_in(start_ts, end_ts)
 selected_modes = st.multiselect("Filter by Transport Mode", options=modes, default=modes)
-df_filtered = df_filtered[df_filtered["transport_mode"].isin(selected_modes)]
+daily = index.daily(start_ts, end_ts, selected_modes)
+filter_key = (data_fingerprint, start_ts, end_ts, tuple(sorted(selected_modes)))
+
+# Long ranges are summed into weekly/monthly buckets (and long forecast/anomaly
+# series thinned with LTTB) so the browser gets at most MAX_POINTS per trace
+full_resolution = st.checkbox("Full resolution charts", value=False,
+                              help=f"Send every day to the charts instead of at most {MAX_POINTS} points per series")
+bucket_freq, bucket_label = ("D", "Daily") if full_resolution else choose_bucket(start_ts, end_ts)
+chart_points = None if full_resolution else MAX_POINTS
 
 # Total Emissions by Transport Mode
 st.subheader("Total Emissions by Transport Mode")
 st.markdown("""
 This graph shows the **total carbon emissions by transport mode**. It helps identify which modes of public transport, such as buses, trams, and trains, are contributing the most to the city's carbon footprint.
 """)
-mode_group = df_filtered.groupby("transport_mode")["emission_kg"].sum().reset_index()
+mode_group = index.totals_by_mode(start_ts, end_ts, selected_modes).reset_index()
 fig_mode = px.bar(mode_group, x="transport_mode", y="emission_kg", color_discrete_sequence=[PRIMARY_BVG])
 update_plotly_layout(fig_mode)
 st.plotly_chart(fig_mode, use_container_width=True)
@@ -76,8 +124,8 @@ st.subheader("Daily Emissions")
 st.markdown("""
 This graph shows the **cumulative daily emissions** over time. It allows us to track the emissions for each day and observe the trends in carbon emissions on a daily basis over the selected period.
 """)
-daily_emissions = df_filtered.resample("D").sum(numeric_only=True).reset_index()
-fig_area = px.area(daily_emissions, x="datetime", y="emission_kg", color_discrete_sequence=[PRIMARY_BVG], title="Cumulative Daily Emissions")
+daily_emissions = bucket_sum(daily, bucket_freq).reset_index()
+fig_area = px.area(daily_emissions, x="datetime", y="emission_kg", color_discrete_sequence=[PRIMARY_BVG], title=f"Cumulative {bucket_label} Emissions")
 update_plotly_layout(fig_area)
 st.plotly_chart(fig_area, use_container_width=True)
 
@@ -86,37 +134,54 @@ st.subheader("Daily Emissions with Top 5 Impact")
 st.markdown("""
 This chart shows all daily emissions, with the **top 5 highest-emission days** highlighted in black. It helps identify the days when emissions spiked the most, providing insight into peak emission events.
 """)
-top5 = daily_emissions.sort_values(by="emission_kg", ascending=False).head(5)
-fig_all_days = px.bar(daily_emissions, x="datetime", y="emission_kg", color_discrete_sequence=[PRIMARY_BVG], title="All Emission Days")
+if bucket_freq == "D":
+    top5 = index.top_days(5, start_ts, end_ts, selected_modes)
+else:
+    top5 = daily_emissions.sort_values(by="emission_kg", ascending=False).head(5)
+fig_all_days = px.bar(daily_emissions, x="datetime", y="emission_kg", color_discrete_sequence=[PRIMARY_BVG], title="All Emission Days" if bucket_freq == "D" else f"All Emission Days ({bucket_label} Totals)")
 fig_all_days.add_trace(go.Bar(
     x=top5["datetime"], 
     y=top5["emission_kg"], 
     marker_color="grey",  # Highlight top 5 bars in black
-    name="Top 5 Days"
+    name="Top 5 Days" if bucket_freq == "D" else f"Top 5 {bucket_label} Totals"
 ))
 update_plotly_layout(fig_all_days)
 st.plotly_chart(fig_all_days, use_container_width=True)
+if bucket_freq != "D":
+    st.caption(f"{len(daily)} days shown as {len(daily_emissions)} {bucket_label.lower()} totals; tick \"Full resolution charts\" for every day.")
 
 # Emission Forecast using Prophet (Next 7 Days)
 st.subheader("Emission Forecast using Prophet (Next 7 Days)")
 st.markdown("""
 This forecast predicts the emissions for the **next 7 days** using the **Prophet model**. It gives an insight into future trends, helping stakeholders anticipate emissions and plan mitigation efforts.
 """)
-model, forecast = forecast_emissions(df_filtered)
-fig_forecast = px.line(forecast, x="ds", y="yhat", color_discrete_sequence=[PRIMARY_BVG])
-update_plotly_layout(fig_forecast)
-st.plotly_chart(fig_forecast, use_container_width=True)
+# Prophet needs at least two days; none are left when every mode is deselected
+if len(daily) < 2:
+    st.info("Not enough days with trips in the selected range and modes to fit a forecast.")
+else:
+    forecast, fit_metrics = cached_forecast(*filter_key, _df=daily)
+    forecast_points = forecast if chart_points is None else lttb(forecast, "ds", "yhat", chart_points)
+    fig_forecast = px.line(forecast_points, x="ds", y="yhat", color_discrete_sequence=[PRIMARY_BVG])
+    update_plotly_layout(fig_forecast)
+    st.plotly_chart(fig_forecast, use_container_width=True)
+    st.caption(f"Model fit: {fit_metrics['mode']} in {fit_metrics['fit_seconds']:.2f}s over {fit_metrics['history_days']} days")
 
 # Anomaly Detection
 st.subheader("Anomaly Detection")
 st.markdown("""
 This scatter plot visualizes **anomalies in emissions**. Days marked in red represent anomalous emissions, which might be caused by disruptions, unexpected traffic, or errors in data collection. Identifying these anomalies helps in detecting unusual patterns in emissions.
 """)
-df_anomalies = detect_anomalies(df_filtered).reset_index()
-df_anomalies["status"] = df_anomalies["anomaly"].map({1: "Normal", -1: "Anomaly"})
-fig_anom = px.scatter(df_anomalies, x="datetime", y="emission_kg", color="status", color_discrete_map={"Normal": PRIMARY_BVG, "Anomaly": "red"})
-update_plotly_layout(fig_anom)
-st.plotly_chart(fig_anom, use_container_width=True)
+anomaly_engine = st.selectbox("Anomaly detection engine", options=list(ANOMALY_ENGINES), format_func=lambda name: name.replace("_", " ").title())
+if daily.empty:
+    df_anomalies = daily.assign(anomaly=pd.Series(dtype="int64")).reset_index()
+    st.info("No trips in the selected range and modes.")
+else:
+    df_anomalies = cached_anomalies(*filter_key, anomaly_engine, _df=daily).reset_index()
+    df_anomalies["status"] = df_anomalies["anomaly"].map({1: "Normal", -1: "Anomaly"})
+    anomaly_points = df_anomalies if chart_points is None else lttb(df_anomalies, "datetime", "emission_kg", chart_points, keep=df_anomalies["anomaly"] == -1)
+    fig_anom = px.scatter(anomaly_points, x="datetime", y="emission_kg", color="status", color_discrete_map={"Normal": PRIMARY_BVG, "Anomaly": "red"})
+    update_plotly_layout(fig_anom)
+    st.plotly_chart(fig_anom, use_container_width=True)
 
 # Berlin Sustainability Estimate
 st.subheader("Berlin Sustainability Estimate (Based on 60 Days Data)")
@@ -169,8 +234,8 @@ st.plotly_chart(fig_survival, use_container_width=True, key="berlin_sustainabili
 
 # Key Emission Stats
 st.subheader("Key Emission Stats")
-total_emission = df_filtered["emission_kg"].sum()
-daily_recent = df_filtered.resample("D").sum(numeric_only=True).tail(7)["emission_kg"].sum()
+total_emission = index.total(start_ts, end_ts, selected_modes)
+daily_recent = index.recent_total(7, start_ts, end_ts, selected_modes)
 anomalies_count = df_anomalies[df_anomalies["anomaly"] == -1].shape[0]
 offset_cost = total_emission * 0.01
 st.markdown(f"**Total Emissions:** {total_emission:.2f} kg CO₂")
@@ -178,6 +243,12 @@ st.markdown(f"**Last 7 Days Emissions:** {daily_recent:.2f} kg CO₂")
 st.markdown(f"**Anomaly Days Detected:** {anomalies_count}")
 st.markdown(f"**Carbon Offset Estimate:** ${offset_cost:.2f} *(at $0.01 per kg CO₂)*")
 
+# Trip-level drill-down; only the months in the selected range are read
+with st.expander("Trips in the Selected Range"):
+    trips = query_emissions(partition_dir, start_ts, end_ts, selected_modes)
+    st.caption(f"{len(trips)} trips; the latest 1,000 are listed")
+    st.dataframe(trips.sort_index(ascending=False).head(1000), use_container_width=True)
+
 st.markdown("""
     <hr>
     <div style="text-align: center; font-size: 12px; color: #777;">
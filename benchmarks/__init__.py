@@ -0,0 +1 @@
+# benchmarks (Offline performance benchmarks for the emission pipeline)
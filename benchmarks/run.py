@@ -0,0 +1,135 @@
+# benchmarks/run.py (Timed benchmarks over synthetic trip histories)
+#
+# Usage: python -m benchmarks.run --sizes 1000 10000 100000 --output benchmarks/results.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+from benchmarks.synthetic import write_trips
+from distance_index import DistanceIndex
+from rollup import build_rollup, daily_by_mode, daily_totals, totals_by
+from time_series import detect_anomalies, forecast_emissions, frame_memory_mb, load_emission_data
+import visualize
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+RESULTS_FILE = 'benchmarks/results.json'
+
+
+# Best-of-N wall time of fn(); returns (seconds, last result)
+def timed(fn, repeats):
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def aggregate(df):
+    rollup = build_rollup(df)
+    return rollup, totals_by(rollup, 'transport_mode'), totals_by(rollup, 'user_id'), daily_by_mode(rollup), daily_totals(rollup)
+
+
+def render_charts(out_dir, by_mode, by_user, daily_mode, model, forecast, anomalies):
+    visualize.plot_emissions_by_mode(by_mode, save_path=os.path.join(out_dir, 'by_mode.png'))
+    visualize.plot_daily_emissions_stacked(daily_mode, save_path=os.path.join(out_dir, 'daily_mode.png'))
+    visualize.plot_emissions_by_user(by_user, save_path=os.path.join(out_dir, 'by_user.png'))
+    visualize.plot_anomalies(anomalies, save_path=os.path.join(out_dir, 'anomalies.png'))
+    visualize.plot_forecast(model, forecast, save_path=os.path.join(out_dir, 'forecast.png'))
+
+
+def run_size(n_trips, users, days, repeats, work_dir):
+    path = os.path.join(work_dir, f'trips_{n_trips}.jsonl')
+    results = {}
+    results['generate'], _ = timed(lambda: write_trips(path, n_trips, users=users, days=days), 1)
+    # Synthetic routes stay out of the shared on-disk distance index. Cold loads
+    # start from an empty index and compute every distance; warm loads reuse one
+    # filled by an earlier load and time only the lookups.
+    cold = lambda **kwargs: load_emission_data(path, distance_index=DistanceIndex(':memory:'), **kwargs)
+    index = DistanceIndex(':memory:')
+    results['load_emission_data_cold'], _ = timed(cold, repeats)
+    load_emission_data(path, distance_index=index)
+    results['load_emission_data'], df = timed(lambda: load_emission_data(path, distance_index=index), repeats)
+    results['load_emission_data_compact'], df_compact = timed(
+        lambda: load_emission_data(path, compact=True, distance_index=index), repeats)
+    memory = {'load_emission_data': frame_memory_mb(df), 'load_emission_data_compact': frame_memory_mb(df_compact)}
+    del df_compact
+    results['aggregations'], (_, by_mode, by_user, daily_mode, daily) = timed(lambda: aggregate(df), repeats)
+    results['forecast_emissions'], (model, forecast) = timed(lambda: forecast_emissions(daily), repeats)
+    results['detect_anomalies'], anomalies = timed(lambda: detect_anomalies(daily), repeats)
+    results['detect_anomalies_ewma'], _ = timed(lambda: detect_anomalies(daily, engine='ewma'), repeats)
+    daily_mode.index = daily_mode.index.date
+    results['render_charts'], _ = timed(
+        lambda: render_charts(work_dir, by_mode, by_user, daily_mode, model, forecast, anomalies), 1)
+    os.remove(path)
+    rows = [{'benchmark': name, 'trips': n_trips, 'seconds': round(seconds, 6)} for name, seconds in results.items()]
+    for row in rows:
+        if row['benchmark'] in memory:
+            row['memory_mb'] = round(memory[row['benchmark']], 3)
+    return rows
+
+
+# Wall time of a fresh interpreter importing each entry module (lazy-import regressions show up here)
+def startup_times(repeats, modules=('cli', 'main')):
+    command = lambda module: subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+    return {module: round(timed(lambda: command(module), repeats)[0], 4) for module in modules}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the emission pipeline on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='trip counts to benchmark')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeats', type=int, default=3, help='runs per timing; the best is kept')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON file the results are written to')
+    args = parser.parse_args()
+
+    startup = startup_times(args.repeats)
+    for module, seconds in startup.items():
+        print(f"{'startup':>10} {'import ' + module:<28} {seconds:.4f}s")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_trips in args.sizes:
+            size_rows = run_size(n_trips, args.users, args.days, args.repeats, work_dir)
+            for row in size_rows:
+                memory = f"  {row['memory_mb']:.2f} MB" if 'memory_mb' in row else ''
+                print(f"{row['trips']:>10} {row['benchmark']:<28} {row['seconds']:.4f}s{memory}")
+            rows.extend(size_rows)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'config': {'users': args.users, 'days': args.days, 'repeats': args.repeats},
+        'startup_seconds': startup,
+        'results': rows
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
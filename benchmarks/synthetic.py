@@ -0,0 +1,75 @@
+# benchmarks/synthetic.py (Fast offline generator of data.json-schema trips)
+
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from data_collector import random_location, transport_modes
+from emission import calculate_distance_km_batch, estimate_emission_batch
+
+CHUNK_SIZE = 100_000
+
+
+# A fixed pool of stops drawn with random_location; trips pick pairs from it,
+# so stop pairs repeat the way real routes do
+def make_stops(n_stops, seed=0):
+    random.seed(seed)
+    return [dict(type='location', id=str(900000000 + i), **random_location()) for i in range(n_stops)]
+
+
+# Yield lists of trip entries, at most CHUNK_SIZE at a time
+def generate_trips(n_trips, users=3, days=60, n_stops=50, seed=0, end=None):
+    rng = np.random.default_rng(seed)
+    stops = make_stops(n_stops, seed)
+    lat = np.array([s['latitude'] for s in stops])
+    lon = np.array([s['longitude'] for s in stops])
+    user_ids = [f'user_{i + 1}' for i in range(users)]
+    end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+
+    for offset in range(0, n_trips, CHUNK_SIZE):
+        n = min(CHUNK_SIZE, n_trips - offset)
+        src = rng.integers(0, n_stops, n)
+        dst = (src + rng.integers(1, n_stops, n)) % n_stops if n_stops > 1 else src
+        modes = np.array(transport_modes)[rng.integers(0, len(transport_modes), n)]
+        users_idx = rng.integers(0, users, n)
+        minutes = rng.integers(0, days * 24 * 60, n)
+        emission = estimate_emission_batch(
+            calculate_distance_km_batch(lat[src], lon[src], lat[dst], lon[dst]), modes)
+
+        yield [
+            {
+                'user_id': user_ids[u],
+                'startingAddress': 'Synthetic',
+                'destinationAddress': 'Synthetic',
+                'dateTime': (start + timedelta(minutes=int(m))).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'transportMode': str(mode),
+                'fromStops': [{'location': stops[a]}],
+                'toStops': [{'location': stops[b]}],
+                'emission_kg': float(e)
+            }
+            for u, m, mode, a, b, e in zip(users_idx, minutes, modes, src, dst, emission)
+        ]
+
+
+# Write n_trips synthetic trips as JSONL (or a JSON array when path ends in .json)
+def write_trips(path, n_trips, **kwargs):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    as_array = path.endswith('.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        first = True
+        if as_array:
+            f.write('[')
+        for chunk in generate_trips(n_trips, **kwargs):
+            if as_array:
+                body = ','.join(json.dumps(entry) for entry in chunk)
+                f.write(body if first else ',' + body)
+            else:
+                f.write(''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in chunk))
+            first = False
+        if as_array:
+            f.write(']')
+    return path
@@ -0,0 +1,142 @@
+# bvg_client.py (Pooled, rate-limited and cached client for the BVG REST API)
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Point BVG_BASE_URL at a local stub server (python bvg_stub.py) to run without the real API
+BASE_URL = os.environ.get('BVG_BASE_URL', 'https://v6.bvg.transport.rest')
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# Spaces calls so that no more than `rate` requests start per second
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Bounded response cache; entries expire after ttl seconds, oldest evicted first
+class TTLCache:
+    def __init__(self, ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class BVGClient:
+    def __init__(self, base_url=BASE_URL, timeout=10, max_workers=4, requests_per_second=5,
+                 max_retries=3, backoff=0.5, cache_ttl=300, cache_size=1024):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = TTLCache(cache_ttl, cache_size)
+        self.limiter = RateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    # GET a JSON resource; identical concurrent calls share a single request
+    def get(self, path, params=None):
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            data = self._request(path, params)
+            if data is not None:
+                self.cache.set(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    # Retry connection errors and retryable statuses with exponential backoff
+    def _request(self, path, params):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.get(f'{self.base_url}{path}', params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        return None
+
+    def locations(self, query, results=1):
+        return self.get('/locations', {'query': query, 'results': results})
+
+    def journeys(self, from_id, to_id, departure, results=1, language='en'):
+        return self.get('/journeys', {'from': from_id, 'to': to_id, 'departure': departure,
+                                      'results': results, 'language': language})
+
+    # Run fn over items on the client's thread pool, preserving order
+    def map(self, fn, items):
+        return list(self.executor.map(fn, items))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,152 @@
+# bvg_stub.py (Local stand-in for the BVG REST API, for tests and offline runs)
+#
+# Usage: python bvg_stub.py --port 8765
+#        BVG_BASE_URL=http://127.0.0.1:8765 python collector_service.py --once
+#
+# Answers /locations and /journeys with canned, deterministic data. Statuses
+# queued with fail() are answered first (e.g. one 429 before a 200), and every
+# request is recorded with its arrival time so tests can check retries, rate
+# limiting, caching and coalescing against a real HTTP round trip.
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Stops the collector polls by default, as they appear in data.json
+KNOWN_STOPS = {
+    'Brandenburg Gate': ('900100025', 52.51651, 13.381936),
+    'East Side Gallery': ('900120544', 52.505957, 13.438388)
+}
+
+
+def _stop(stop_id, name, latitude, longitude):
+    return {'type': 'stop', 'id': stop_id, 'name': name,
+            'location': {'type': 'location', 'id': stop_id, 'latitude': latitude, 'longitude': longitude}}
+
+
+# The stop for an address: a known one, else a made-up stop in central Berlin
+def stop_for(query):
+    if query in KNOWN_STOPS:
+        stop_id, latitude, longitude = KNOWN_STOPS[query]
+        return _stop(stop_id, query, latitude, longitude)
+    digest = int(hashlib.sha1(query.encode()).hexdigest()[:8], 16)
+    return _stop(f"9001{digest % 100000:05d}", query, 52.48 + (digest % 700) / 10000, 13.33 + (digest % 1300) / 10000)
+
+
+def _stop_by_id(stop_id):
+    for name, (known_id, latitude, longitude) in KNOWN_STOPS.items():
+        if known_id == stop_id:
+            return _stop(stop_id, name, latitude, longitude)
+    return stop_for(stop_id)
+
+
+# `results` journeys ten minutes apart from the requested departure; the
+# realtime departure of each runs `delay` seconds behind the planned one
+def journeys(from_id, to_id, departure, results=1, delay=0):
+    planned = datetime.fromisoformat(departure.replace('Z', '+00:00'))
+    found = []
+    for i in range(results):
+        when = planned + timedelta(minutes=10 * i)
+        found.append({'legs': [{
+            'origin': _stop_by_id(from_id),
+            'destination': _stop_by_id(to_id),
+            'plannedDeparture': when.isoformat(),
+            'departure': (when + timedelta(seconds=delay)).isoformat(),
+            'line': {'product': 'bus', 'name': 'M29'}
+        }]})
+    return {'journeys': found}
+
+
+class StubBVG:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, delay=0):
+        self.latency = latency  # seconds each response is held back
+        self.delay = delay      # seconds every journey runs late
+        self.requests = []      # (arrival time.monotonic(), path, params)
+        self._failures = deque()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Answer the next len(statuses) requests with these statuses
+    def fail(self, *statuses):
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def count(self, path=None):
+        with self._lock:
+            return sum(1 for _, seen, _ in self.requests if path is None or seen == path)
+
+    def _respond(self, path, params):
+        with self._lock:
+            self.requests.append((time.monotonic(), path, params))
+            status = self._failures.popleft() if self._failures else 200
+        if self.latency:
+            time.sleep(self.latency)
+        if status != 200:
+            return status, {'error': 'stub failure'}
+        if path == '/locations':
+            return 200, [stop_for(params.get('query', ''))]
+        if path == '/journeys':
+            return 200, journeys(params['from'], params['to'], params['departure'],
+                                 int(params.get('results', 1)), self.delay)
+        return 404, {'error': f"unknown path {path}"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                status, body = stub._respond(url.path, dict(parse_qsl(url.query)))
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the BVG REST API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each response is held back')
+    args = parser.parse_args()
+    stub = StubBVG(args.host, args.port, latency=args.latency)
+    print(f"BVG stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
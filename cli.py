@@ -0,0 +1,150 @@
+# cli.py (Command line entry point: load, aggregate, forecast, anomalies, report)
+#
+# Usage: python cli.py aggregate --by transport_mode
+#        python cli.py report --grouped-forecast user_id
+#
+# Each subcommand imports only what it uses, so a quick look at the totals
+# never loads Prophet, scikit-learn or the plotting libraries. The time spent
+# starting up (interpreter excluded) and in the command itself is printed to
+# stderr; --max-startup turns a slow start into a failing exit status.
+
+import time
+
+_started = time.perf_counter()
+
+import argparse
+import sys
+from trip_store import resolve_data_file
+
+_ready = None
+
+
+# Called by each command once its imports are done
+def _loaded():
+    global _ready
+    _ready = time.perf_counter()
+
+
+def _load_frame(args):
+    from emission_cache import load_emission_data_cached
+    from partitions import update_partitions
+    from time_series import query_emissions
+    _loaded()
+    if args.start or args.end or args.modes:
+        return query_emissions(update_partitions(args.data), args.start, args.end, args.modes, compact=args.compact)
+    return load_emission_data_cached(args.data, compact=args.compact)
+
+
+def _load_daily(args):
+    import pandas as pd
+    from rollup import build_rollup_chunked, daily_totals, filter_rollup, load_rollup
+    _loaded()
+    rollup = build_rollup_chunked(args.data, chunk_size=args.chunk_size) if args.chunk_size else load_rollup(args.data)
+    start = pd.Timestamp(args.start, tz='UTC') if args.start else None
+    end = pd.Timestamp(args.end, tz='UTC') if args.end else None
+    rollup = filter_rollup(rollup, start, end, args.modes)
+    return rollup, daily_totals(rollup)
+
+
+def cmd_load(args):
+    from time_series import frame_memory_mb, report_compact_memory
+    df = _load_frame(args)
+    print(f"{len(df)} trips from {df.index.min()} to {df.index.max()} ({frame_memory_mb(df):.2f} MB)")
+    if args.compact:
+        report_compact_memory(df)
+    print(df.head())
+
+
+def cmd_aggregate(args):
+    from rollup import totals_by
+    rollup, daily = _load_daily(args)
+    print(totals_by(rollup, args.by).to_string())
+    print(f"\nTotal: {daily['emission_kg'].sum():.2f} kg CO2 over {len(daily)} days")
+
+
+def cmd_forecast(args):
+    from forecaster import PersistentForecaster
+    _, daily = _load_daily(args)
+    forecaster = PersistentForecaster('cli')
+    _, forecast = forecaster.forecast(daily, days=args.days)
+    print(forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(args.days).to_string(index=False))
+    print("\nForecast fit:", forecaster.metrics)
+
+
+def cmd_anomalies(args):
+    from time_series import detect_anomalies
+    _, daily = _load_daily(args)
+    df_anomalies = detect_anomalies(daily, engine=args.engine, name='cli')
+    anomalies = df_anomalies[df_anomalies['anomaly'] == -1]
+    print(anomalies[['emission_kg']].to_string() if len(anomalies) else "No anomalies")
+    print(f"\n{len(anomalies)} anomaly days out of {len(df_anomalies)}")
+
+
+def cmd_report(args):
+    import main
+    _loaded()
+    main.main(main.parse_args(args.options))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Emission pipeline commands.')
+    parser.add_argument('--max-startup', type=float, default=None,
+                        help='exit with status 1 when startup takes longer than this many seconds')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def command(name, func, help, filters=True):
+        sub = commands.add_parser(name, help=help)
+        sub.set_defaults(func=func)
+        if filters:
+            sub.add_argument('--data', default=None, help='trip store (default: data/trips.jsonl, else data/data.json)')
+            sub.add_argument('--start', default=None, help='first day, YYYY-MM-DD')
+            sub.add_argument('--end', default=None, help='last day, YYYY-MM-DD (inclusive)')
+            sub.add_argument('--modes', nargs='+', default=None, help='transport modes to keep')
+            sub.add_argument('--chunk-size', type=int, default=None,
+                             help='aggregate the trip history in batches of this many trips')
+        return sub
+
+    load = command('load', cmd_load, 'load the emission frame and print a sample', filters=False)
+    load.add_argument('--data', default=None, help='trip store (default: data/trips.jsonl, else data/data.json)')
+    load.add_argument('--start', default=None, help='first day, YYYY-MM-DD (reads only the months needed)')
+    load.add_argument('--end', default=None, help='last day, YYYY-MM-DD (inclusive)')
+    load.add_argument('--modes', nargs='+', default=None, help='transport modes to keep')
+    load.add_argument('--compact', action='store_true', help='categorical mode/user and float32 emissions')
+
+    aggregate = command('aggregate', cmd_aggregate, 'print total emissions')
+    aggregate.add_argument('--by', choices=['transport_mode', 'user_id', 'date'], default='transport_mode')
+
+    forecast = command('forecast', cmd_forecast, 'forecast daily emissions')
+    forecast.add_argument('--days', type=int, default=7)
+
+    anomalies = command('anomalies', cmd_anomalies, 'list anomalous days')
+    # Engine names are listed here rather than read from time_series to keep startup light
+    anomalies.add_argument('--engine', choices=['ewma', 'isolation_forest'], default='isolation_forest')
+
+    # Everything after `report` is handed to main.py's own parser
+    command('report', cmd_report, 'run the full report (options as for main.py)', filters=False)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'report':
+        args.options = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if getattr(args, 'data', False) is None:
+        args.data = resolve_data_file()
+    return args
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    args.func(args)
+    finished = time.perf_counter()
+    startup = (_ready or finished) - _started
+    print(f"\n[{args.command}] startup {startup:.2f}s, command {finished - (_ready or finished):.2f}s", file=sys.stderr)
+    if args.max_startup is not None and startup > args.max_startup:
+        print(f"Startup exceeded --max-startup {args.max_startup:.2f}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,379 @@
+# collector_service.py (Long-running collector: polls BVG journeys for many routes on a schedule)
+#
+# Usage: python collector_service.py --route "user_1|Brandenburg Gate|East Side Gallery" --interval 300
+#
+# A scheduler thread queues one poll per route every interval; poll workers
+# fetch upcoming journeys through the shared BVGClient (which rate limits and
+# pools connections); a single writer deduplicates trips by (user, dateTime,
+# stops), appends them to the JSONL store in batches and folds each batch into
+# the cached emission frame and rollup, which only read the appended lines.
+
+import argparse
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from bvg_client import BVGClient
+from data_collector import get_closest_stop, user_ids
+from distance_index import default_index
+from emission import estimate_emission
+from trip_store import DEFAULT_STORE, TripStore, ensure_store, iter_trips
+
+METRICS_FILE = 'data/collector_metrics.json'
+DEFAULT_ROUTES = [(user_id, 'Brandenburg Gate', 'East Side Gallery') for user_id in user_ids]
+DEDUPE_WINDOW = timedelta(days=2)  # trips older than this are never returned by a poll again
+THROUGHPUT_WINDOW = 60  # seconds
+
+# BVG line products mapped onto the transport modes the emission factors know
+PRODUCT_MODES = {
+    'suburban': 'train', 'regional': 'train', 'express': 'train',
+    'subway': 'subway', 'tram': 'tram', 'bus': 'bus'
+}
+
+
+def _utc(timestamp):
+    when = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return when.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _stop_key(stops):
+    return tuple(stop['location'].get('id') or stop.get('id') or (stop['location']['latitude'], stop['location']['longitude'])
+                 for stop in stops)
+
+
+# A journey end as data.json stores it: the stop ID sits in the location, where
+# the loader and the distance index look for it
+def _stop_entry(stop):
+    location = stop['location']
+    return {'location': {'type': 'location', 'id': location.get('id') or stop.get('id'),
+                         'latitude': location['latitude'], 'longitude': location['longitude']}}
+
+
+# Identity of a trip for deduplication: the same journey is returned by every
+# poll until it departs
+def trip_key(entry):
+    return entry.get('user_id'), entry.get('dateTime'), _stop_key(entry.get('fromStops', [])), _stop_key(entry.get('toStops', []))
+
+
+# Turn one BVG journey into a store entry; None for walking-only journeys
+def journey_entry(journey, user_id, start_address, dest_address):
+    legs = journey.get('legs') or []
+    rides = [leg for leg in legs if not leg.get('walking') and leg.get('line')]
+    if not rides:
+        return None
+    origin, destination = legs[0]['origin'], legs[-1]['destination']
+    # The planned time: departure moves with every reported delay, and dateTime
+    # is part of the dedup key
+    departure = legs[0].get('plannedDeparture') or legs[0].get('departure')
+    if not departure or 'location' not in origin or 'location' not in destination:
+        return None
+
+    transport_mode = PRODUCT_MODES.get(rides[0]['line'].get('product'), rides[0]['line'].get('product'))
+    from_stop, to_stop = _stop_entry(origin), _stop_entry(destination)
+    distance = default_index().distance(from_stop['location'], to_stop['location'])
+    return {
+        'user_id': user_id,
+        'startingAddress': start_address,
+        'destinationAddress': dest_address,
+        'dateTime': _utc(departure),
+        'transportMode': transport_mode,
+        'fromStops': [from_stop],
+        'toStops': [to_stop],
+        'emission_kg': estimate_emission(distance, transport_mode)
+    }
+
+
+# Counters and gauges shared by the scheduler, pollers and writer
+class CollectorMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.polls = 0
+        self.poll_errors = 0
+        self.dropped_polls = 0
+        self.trips_received = 0
+        self.trips_written = 0
+        self.duplicates = 0
+        self.flushes = 0
+        self.schedule_lag_s = 0.0
+        self.max_schedule_lag_s = 0.0
+        self.write_lag_s = 0.0
+        self.last_flush = None
+        self._written = deque()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    # Time between a poll being due and a worker starting it
+    def record_schedule_lag(self, seconds):
+        with self._lock:
+            self.schedule_lag_s = seconds
+            self.max_schedule_lag_s = max(self.max_schedule_lag_s, seconds)
+
+    # Time between the oldest trip of a batch being fetched and the batch landing on disk
+    def record_flush(self, written, write_lag):
+        now = time.monotonic()
+        with self._lock:
+            self.trips_written += written
+            self.flushes += 1
+            self.write_lag_s = write_lag
+            self.last_flush = datetime.now(timezone.utc).isoformat()
+            self._written.append((now, written))
+
+    def throughput(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._written and self._written[0][0] < now - THROUGHPUT_WINDOW:
+                self._written.popleft()
+            window = min(THROUGHPUT_WINDOW, now - self.started) or 1.0
+            return sum(n for _, n in self._written) / window
+
+    def snapshot(self, poll_queue, write_queue):
+        trips_per_s = self.throughput()
+        with self._lock:
+            return {
+                'uptime_s': round(time.monotonic() - self.started, 1),
+                'polls': self.polls,
+                'poll_errors': self.poll_errors,
+                'dropped_polls': self.dropped_polls,
+                'trips_received': self.trips_received,
+                'trips_written': self.trips_written,
+                'duplicates': self.duplicates,
+                'flushes': self.flushes,
+                'throughput_trips_per_s': round(trips_per_s, 3),
+                'poll_queue_depth': poll_queue,
+                'write_queue_depth': write_queue,
+                'schedule_lag_s': round(self.schedule_lag_s, 3),
+                'max_schedule_lag_s': round(self.max_schedule_lag_s, 3),
+                'write_lag_s': round(self.write_lag_s, 3),
+                'last_flush': self.last_flush
+            }
+
+
+class CollectorService:
+    def __init__(self, routes, filename=DEFAULT_STORE, interval=300, results=3, poll_workers=4,
+                 batch_size=100, flush_interval=10, fsync=False, refresh=True,
+                 metrics_file=METRICS_FILE, client=None):
+        self.routes = routes
+        self.filename = ensure_store(filename)
+        self.interval = interval
+        self.results = results
+        self.poll_workers = poll_workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.refresh = refresh
+        self.metrics_file = metrics_file
+        self.client = client or BVGClient(max_workers=poll_workers)
+        self.store = TripStore(self.filename, batch_size=batch_size, fsync=fsync)
+        self.metrics = CollectorMetrics()
+        self.polls = queue.Queue(maxsize=max(len(routes), 1) * 2)
+        self.trips = queue.Queue()
+        self.stopping = threading.Event()
+        self._stops = {}
+        self._seen = self._load_seen()
+        self._batch = []
+        self._threads = []
+
+    # Dedupe keys of the trips already stored that a poll could still return
+    def _load_seen(self):
+        cutoff = (datetime.now(timezone.utc) - DEDUPE_WINDOW).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return {trip_key(entry): entry['dateTime'] for entry in iter_trips(self.filename)
+                if entry.get('dateTime', '') >= cutoff}
+
+    def _prune_seen(self):
+        cutoff = (datetime.now(timezone.utc) - DEDUPE_WINDOW).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._seen = {key: when for key, when in self._seen.items() if when >= cutoff}
+
+    # Only found stops are kept; a failed lookup is tried again on the next poll
+    def _stop(self, address):
+        stop = self._stops.get(address)
+        if stop is None:
+            stop = get_closest_stop(address, self.client)
+            if stop:
+                self._stops[address] = stop
+        return stop
+
+    # Queue one poll per route; a poll that does not fit is dropped rather than
+    # piling up behind a slow API
+    def schedule(self):
+        due = time.monotonic()
+        for route in self.routes:
+            try:
+                self.polls.put_nowait((due, route))
+            except queue.Full:
+                self.metrics.add(dropped_polls=1)
+
+    def _scheduler(self):
+        while not self.stopping.is_set():
+            self.schedule()
+            self.stopping.wait(self.interval)
+
+    def poll(self, route):
+        user_id, start_address, dest_address = route
+        from_stop, to_stop = self._stop(start_address), self._stop(dest_address)
+        if not from_stop or not to_stop:
+            self.metrics.add(polls=1, poll_errors=1)
+            return []
+        departure = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        try:
+            data = self.client.journeys(from_stop['id'], to_stop['id'], departure, results=self.results)
+        except Exception:
+            data = None
+        if not data:
+            self.metrics.add(polls=1, poll_errors=1)
+            return []
+        entries = [journey_entry(journey, user_id, start_address, dest_address) for journey in data.get('journeys', [])]
+        entries = [entry for entry in entries if entry]
+        self.metrics.add(polls=1, trips_received=len(entries))
+        return entries
+
+    def _poller(self):
+        while True:
+            item = self.polls.get()
+            if item is None:
+                return
+            due, route = item
+            self.metrics.record_schedule_lag(time.monotonic() - due)
+            fetched = time.monotonic()
+            for entry in self.poll(route):
+                self.trips.put((fetched, entry))
+
+    def _refresh_derived(self):
+        if not self.refresh:
+            return
+        # Imported here so the service starts without pandas when refresh is off
+        from rollup import load_rollup
+        try:
+            load_rollup(self.filename)
+        except Exception as exc:
+            print(f"Rollup refresh failed: {exc}")
+
+    def flush(self, oldest):
+        if not self._batch:
+            return
+        self.store.extend(self._batch)
+        self.store.flush()
+        self.metrics.record_flush(len(self._batch), time.monotonic() - oldest)
+        self._batch = []
+        self._prune_seen()
+        self._refresh_derived()
+
+    def _writer(self):
+        oldest = None
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.trips.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item:
+                fetched, entry = item
+                key = trip_key(entry)
+                if key in self._seen:
+                    self.metrics.add(duplicates=1)
+                else:
+                    self._seen[key] = entry['dateTime']
+                    self._batch.append(entry)
+                    oldest = fetched if oldest is None else oldest
+            if item is None or len(self._batch) >= self.batch_size \
+                    or time.monotonic() - last_flush >= self.flush_interval:
+                if oldest is not None:
+                    self.flush(oldest)
+                oldest, last_flush = None, time.monotonic()
+            if item is None:
+                return
+
+    def metrics_snapshot(self):
+        return self.metrics.snapshot(self.polls.qsize(), self.trips.qsize() + len(self._batch))
+
+    def write_metrics(self):
+        snapshot = self.metrics_snapshot()
+        if self.metrics_file:
+            directory = os.path.dirname(self.metrics_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.metrics_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, indent=4)
+            os.replace(tmp_path, self.metrics_file)
+        return snapshot
+
+    def _start_workers(self):
+        workers = [threading.Thread(target=self._poller, daemon=True) for _ in range(self.poll_workers)]
+        self._threads = workers + [threading.Thread(target=self._writer, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def start(self):
+        self._start_workers()
+        threading.Thread(target=self._scheduler, daemon=True).start()
+
+    # Let queued polls finish, write what they fetched and stop the threads
+    def stop(self):
+        self.stopping.set()
+        for _ in range(self.poll_workers):
+            self.polls.put(None)
+        for thread in self._threads[:-1]:
+            thread.join()
+        self.trips.put(None)
+        self._threads[-1].join()
+        self.client.close()
+        return self.write_metrics()
+
+    def run(self, metrics_interval=30, once=False):
+        if once:
+            self.schedule()
+            self._start_workers()
+            return self.stop()
+        self.start()
+        try:
+            while not self.stopping.wait(metrics_interval):
+                print("Collector:", self.write_metrics())
+        except KeyboardInterrupt:
+            pass
+        return self.stop()
+
+
+def parse_route(value):
+    parts = [part.strip() for part in value.split('|')]
+    if len(parts) != 3 or not all(parts):
+        raise argparse.ArgumentTypeError('routes look like "user_id|start address|destination address"')
+    return tuple(parts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Continuously collect BVG journeys into the trip store.')
+    parser.add_argument('--route', dest='routes', type=parse_route, action='append',
+                        help='"user_id|start address|destination address"; repeat for more routes')
+    parser.add_argument('--interval', type=float, default=300, help='seconds between polls of each route')
+    parser.add_argument('--results', type=int, default=3, help='journeys requested per poll')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent polls')
+    parser.add_argument('--batch-size', type=int, default=100, help='trips written per store append')
+    parser.add_argument('--flush-interval', type=float, default=10, help='longest a fetched trip waits before being written')
+    parser.add_argument('--fsync', action='store_true', help='fsync every batch')
+    parser.add_argument('--no-refresh', action='store_true', help='do not update the cached frame and rollup after each batch')
+    parser.add_argument('--metrics-file', default=METRICS_FILE, help='JSON file the metrics are written to')
+    parser.add_argument('--metrics-interval', type=float, default=30, help='seconds between metrics reports')
+    parser.add_argument('--once', action='store_true', help='poll every route once, write and exit')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='trip store to append to')
+    return parser.parse_args()
+
+
+def main(args):
+    service = CollectorService(args.routes or DEFAULT_ROUTES, filename=args.store, interval=args.interval,
+                               results=args.results, poll_workers=args.workers, batch_size=args.batch_size,
+                               flush_interval=args.flush_interval, fsync=args.fsync,
+                               refresh=not args.no_refresh, metrics_file=args.metrics_file)
+    signal.signal(signal.SIGTERM, lambda signum, frame: service.stopping.set())
+    print("Collector stopped:", service.run(metrics_interval=args.metrics_interval, once=args.once))
+
+
+if __name__ == '__main__':
+    main(parse_args())
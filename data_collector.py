@@ -1,22 +1,29 @@
 # data_collector.py (Collect real data, fallback to simulate if needed)
 
-import requests
 import json
 import os
 import random
 from datetime import datetime, timedelta
-from emission import calculate_distance_km, estimate_emission
+from emission import estimate_emission
+from distance_index import default_index
+from trip_store import DEFAULT_STORE, TripStore, ensure_store, iter_trips
+from bvg_client import BASE_URL, BVGClient
 
-BASE_URL = 'https://v6.bvg.transport.rest'
 user_ids = ['user_1', 'user_2', 'user_3']  # Simulate 3 users
+transport_modes = ['train', 'bus', 'subway', 'tram']
+_client = None
+
+# Shared pooled client, created on first use
+def get_client():
+    global _client
+    if _client is None:
+        _client = BVGClient()
+    return _client
 
 # Fetch closest stop
-def get_closest_stop(address):
-    params = {'query': address, 'results': 1}
+def get_closest_stop(address, client=None):
     try:
-        response = requests.get(f'{BASE_URL}/locations', params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = (client or get_client()).locations(address) or []
         for item in data:
             if item['type'] in ['stop', 'station']:
                 return item
@@ -24,17 +31,16 @@ def get_closest_stop(address):
         return None
 
 # Fetch journey data from BVG API
-def get_journey_data(from_id, to_id, date_time):
-    url = f'{BASE_URL}/journeys?from={from_id}&to={to_id}&departure={date_time}&results=1&language=en'
+def get_journey_data(from_id, to_id, date_time, client=None):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        return (client or get_client()).journeys(from_id, to_id, date_time)
     except Exception:
         return None
 
 # Read existing data
-def read_existing_data(filename='data/data.json'):
+def read_existing_data(filename=DEFAULT_STORE):
+    if filename.endswith('.jsonl'):
+        return list(iter_trips(filename))
     if os.path.exists(filename):
         with open(filename, 'r') as f:
             try:
@@ -44,13 +50,12 @@ def read_existing_data(filename='data/data.json'):
                 return []
     return []
 
-# Append new data
-def append_data_to_file(new_entry, filename='data/data.json'):
-    existing_data = read_existing_data(filename)
-    existing_data.append(new_entry)
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, 'w') as f:
-        json.dump(existing_data, f, indent=4)
+# Append new data (single line append, no rewrite of existing trips); the
+# legacy data.json is migrated first so its history is not left behind
+def append_data_to_file(new_entry, filename=DEFAULT_STORE):
+    ensure_store(filename)
+    with TripStore(filename, batch_size=1) as store:
+        store.append(new_entry)
 
 # Generate synthetic location
 def random_location():
@@ -60,60 +65,71 @@ def random_location():
     }
 
 # Collect real data or simulate if not available
-def collect_data_with_fallback(start_address, dest_address, days=60, journeys_per_day=3):
-    from_stop = get_closest_stop(start_address)
-    to_stop = get_closest_stop(dest_address)
+def collect_data_with_fallback(start_address, dest_address, days=60, journeys_per_day=3,
+                               filename=DEFAULT_STORE, batch_size=100, fsync=False, client=None):
+    ensure_store(filename)
+    store = TripStore(filename, batch_size=batch_size, fsync=fsync)
+    client = client or get_client()
+
+    from_stop = get_closest_stop(start_address, client)
+    to_stop = get_closest_stop(dest_address, client)
 
     if not from_stop or not to_stop:
         print("Could not fetch valid stops. Switching to simulation only.")
         from_stop = {'location': random_location()}
         to_stop = {'location': random_location()}
 
-    transport_modes = ['train', 'bus', 'subway', 'tram']
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=days)
     current_date = start_date
 
-    while current_date <= end_date:
-        for _ in range(journeys_per_day):
-            simulated_datetime = datetime.combine(current_date, datetime.min.time()) + timedelta(
-                hours=random.choice([8, 12, 18]),
-                minutes=random.randint(0, 59))
-
-            api_datetime = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
-            simulated_date_str = simulated_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-            user_id = random.choice(user_ids)
-            transport_mode = random.choice(transport_modes)
-            journey_data = get_journey_data(from_stop.get('id', ''), to_stop.get('id', ''), api_datetime)
-
-            # If real data not available, simulate journey
-            if not journey_data:
-                from_loc = random_location()
-                to_loc = random_location()
-            else:
-                from_loc = from_stop['location']
-                to_loc = to_stop['location']
-
-            distance = calculate_distance_km(from_loc['latitude'], from_loc['longitude'],
-                                             to_loc['latitude'], to_loc['longitude'])
-            emission = estimate_emission(distance, transport_mode)
-
-            entry = {
-                'user_id': user_id,
-                'startingAddress': start_address,
-                'destinationAddress': dest_address,
-                'dateTime': simulated_date_str,
-                'transportMode': transport_mode,
-                'fromStops': [{'location': from_loc}],
-                'toStops': [{'location': to_loc}],
-                'emission_kg': emission
-            }
-
-            append_data_to_file(entry)
-            status = "Simulated" if not journey_data else "Real"
-            print(f"{status} | Date: {simulated_date_str} | User: {user_id} | Mode: {transport_mode}")
-        current_date += timedelta(days=1)
+    # Every journey query shares one departure time, so repeats are served from the client cache
+    api_datetime = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    from_id, to_id = from_stop.get('id', ''), to_stop.get('id', '')
+    distances = default_index()
+
+    with store:
+        while current_date <= end_date:
+            trips = []
+            for _ in range(journeys_per_day):
+                simulated_datetime = datetime.combine(current_date, datetime.min.time()) + timedelta(
+                    hours=random.choice([8, 12, 18]),
+                    minutes=random.randint(0, 59))
+                trips.append((simulated_datetime, random.choice(user_ids), random.choice(transport_modes)))
+
+            journeys = client.map(lambda _: get_journey_data(from_id, to_id, api_datetime, client), trips)
+
+            for (simulated_datetime, user_id, transport_mode), journey_data in zip(trips, journeys):
+                simulated_date_str = simulated_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+                # If real data not available, simulate journey
+                if not journey_data:
+                    from_loc = random_location()
+                    to_loc = random_location()
+                else:
+                    from_loc = from_stop['location']
+                    to_loc = to_stop['location']
+
+                distance = distances.distance(from_loc, to_loc)
+                emission = estimate_emission(distance, transport_mode)
+
+                entry = {
+                    'user_id': user_id,
+                    'startingAddress': start_address,
+                    'destinationAddress': dest_address,
+                    'dateTime': simulated_date_str,
+                    'transportMode': transport_mode,
+                    'fromStops': [{'location': from_loc}],
+                    'toStops': [{'location': to_loc}],
+                    'emission_kg': emission
+                }
+
+                store.append(entry)
+                status = "Simulated" if not journey_data else "Real"
+                print(f"{status} | Date: {simulated_date_str} | User: {user_id} | Mode: {transport_mode}")
+            current_date += timedelta(days=1)
+
+    print(f"Distance index: {distances.stats()}")
 
 if __name__ == '__main__':
     collect_data_with_fallback('Brandenburg Gate', 'East Side Gallery', days=60, journeys_per_day=3)
\ No newline at end of file
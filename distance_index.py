@@ -0,0 +1,146 @@
+# distance_index.py (Memoized stop-pair distances: in-memory LRU over an SQLite store)
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from emission import calculate_distance_km, calculate_distance_km_batch
+
+INDEX_FILE = 'data/distance_index.sqlite'
+COORD_PRECISION = 5  # ~1 m; used for the key when stop IDs are missing
+
+
+# Route key: the stop ID pair when both IDs are known, else rounded coordinates.
+# Distances are symmetric, so the two ends are put in a fixed order.
+def route_key(from_loc, to_loc, method='geodesic'):
+    a, b = _end_key(from_loc), _end_key(to_loc)
+    return f"{method}|{min(a, b)}|{max(a, b)}"
+
+
+def _end_key(loc):
+    if loc.get('id'):
+        return f"id:{loc['id']}"
+    return f"xy:{round(loc['latitude'], COORD_PRECISION)},{round(loc['longitude'], COORD_PRECISION)}"
+
+
+# hits counts trips served without computing a distance, misses counts routes
+# computed; disk_hits is the part of the hits first loaded from SQLite
+class DistanceIndex:
+    def __init__(self, path=INDEX_FILE, maxsize=10_000):
+        self.path = path
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS distances (key TEXT PRIMARY KEY, km REAL NOT NULL)')
+        self._db.commit()
+
+    def _remember(self, key, km):
+        self._memory[key] = km
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    # Look keys up in memory, then on disk; returns {key: km} for those found
+    def _lookup(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            km = self._memory.get(key)
+            if km is None:
+                missing.append(key)
+            else:
+                self._memory.move_to_end(key)
+                found[key] = km
+
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT key, km FROM distances WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for key, km in rows:
+                found[key] = km
+                self._remember(key, km)
+            self.disk_hits += len(rows)
+        return found
+
+    def _store(self, items):
+        self._db.executemany('INSERT OR REPLACE INTO distances (key, km) VALUES (?, ?)', items)
+        self._db.commit()
+        for key, km in items:
+            self._remember(key, km)
+        self.misses += len(items)
+
+    # Single-trip lookup, computing with geopy on a miss
+    def distance(self, from_loc, to_loc, method='geodesic'):
+        key = route_key(from_loc, to_loc, method)
+        with self._lock:
+            found = self._lookup([key])
+            if key in found:
+                self.hits += 1
+                return found[key]
+            if method == 'geodesic':
+                km = calculate_distance_km(from_loc['latitude'], from_loc['longitude'],
+                                           to_loc['latitude'], to_loc['longitude'])
+            else:
+                km = float(calculate_distance_km_batch(from_loc['latitude'], from_loc['longitude'],
+                                                       to_loc['latitude'], to_loc['longitude'], method=method))
+            self._store([(key, km)])
+            return km
+
+    # Batch lookup for parallel lists of stop locations; only the unique routes
+    # that are not yet indexed are computed, in one vectorized call. counts, when
+    # given, is the number of trips each row stands for (for the hit counter).
+    def distances(self, from_locs, to_locs, method='geodesic', counts=None):
+        keys = [route_key(a, b, method) for a, b in zip(from_locs, to_locs)]
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            found = self._lookup(unique)
+            missing = [i for i, key in enumerate(unique) if key not in found]
+            if missing:
+                missing_keys = {unique[i] for i in missing}
+                first = {}
+                for row, key in enumerate(keys):
+                    if key in missing_keys and key not in first:
+                        first[key] = row
+                rows = [first[unique[i]] for i in missing]
+                km = calculate_distance_km_batch(
+                    [from_locs[r]['latitude'] for r in rows], [from_locs[r]['longitude'] for r in rows],
+                    [to_locs[r]['latitude'] for r in rows], [to_locs[r]['longitude'] for r in rows],
+                    method=method)
+                new = [(unique[i], float(d)) for i, d in zip(missing, km)]
+                self._store(new)
+                found.update(new)
+            self.hits += (sum(counts) if counts is not None else len(keys)) - len(missing)
+        return np.array([found[key] for key in keys], dtype=float)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'cached_routes': len(self._memory)
+        }
+
+    def close(self):
+        self._db.close()
+
+
+_default_index = None
+
+
+# Process-wide index on INDEX_FILE, opened on first use
+def default_index():
+    global _default_index
+    if _default_index is None:
+        _default_index = DistanceIndex()
+    return _default_index
@@ -0,0 +1,63 @@
+# downsample.py (Server-side reduction of time series before they are sent to Plotly)
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 400  # default point budget per time-series chart
+
+# Calendar buckets tried in order until the series fits the budget
+BUCKETS = [('D', 'Daily'), ('W', 'Weekly'), ('MS', 'Monthly'), ('QS', 'Quarterly')]
+
+
+# Coarsest-needed calendar bucket for a date span: (pandas frequency, label)
+def choose_bucket(start, end, max_points=MAX_POINTS):
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    span_in = {'D': days, 'W': days / 7, 'MS': days / 30.4, 'QS': days / 91.3}
+    for freq, label in BUCKETS:
+        if span_in[freq] <= max_points:
+            return freq, label
+    return BUCKETS[-1]
+
+
+# Sum a datetime-indexed frame into calendar buckets
+def bucket_sum(df, freq):
+    if freq == 'D' or df.empty:
+        return df
+    return df.resample(freq).sum(numeric_only=True)
+
+
+# Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual
+# shape of the series (peaks and troughs survive, unlike plain striding)
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bucket = (n - 2) / (n_out - 2)
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+# LTTB over a frame with a datetime (or numeric) column x and value column y;
+# rows where keep is True are always retained
+def lttb(df, x, y, max_points=MAX_POINTS, keep=None):
+    if len(df) <= max_points:
+        return df
+    xs = df[x].astype('int64') if pd.api.types.is_datetime64_any_dtype(df[x]) else df[x]
+    selected = set(lttb_indices(xs.to_numpy(), df[y].to_numpy(), max_points).tolist())
+    if keep is not None:
+        selected.update(np.flatnonzero(np.asarray(keep)).tolist())
+    return df.iloc[sorted(selected)]
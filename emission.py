@@ -1,14 +1,98 @@
 # emissions.py
-from geopy.distance import geodesic
+import numpy as np
+from profiling import profiled
+
+EMISSION_FACTORS = {
+    'train': 0.05,
+    'bus': 0.08,
+    'subway': 0.06,
+    'tram': 0.04
+}
+DEFAULT_FACTOR = 0.06
+
+# WGS-84 ellipsoid (same model geopy's geodesic uses)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+EARTH_RADIUS_KM = 6371.0088
+ANTIPODAL_GUARD_KM = 19_000
 
 def calculate_distance_km(lat1, lon1, lat2, lon2):
+    from geopy.distance import geodesic
     return geodesic((lat1, lon1), (lat2, lon2)).km
 
 def estimate_emission(distance_km, mode='train'):
-    factors = {
-        'train': 0.05,
-        'bus': 0.08,
-        'subway': 0.06,
-        'tram': 0.04
-    }
-    return distance_km * factors.get(mode, 0.06)
+    return distance_km * EMISSION_FACTORS.get(mode, DEFAULT_FACTOR)
+
+# Great-circle distance on a sphere; fast, ~0.5% error against the ellipsoid
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+# Vectorized Vincenty inverse on WGS-84; nearly antipodal pairs, where Vincenty
+# fails to converge or converges poorly, are handed to geopy's Karney solver
+def vincenty_km(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (lat1, lon1, lat2, lon2)))
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_next = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+            converged |= np.abs(lam_next - lam) < tol
+            lam = np.where(converged, lam, lam_next)
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2)
+            - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+        distance = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    near_antipodal = haversine_km(lat1, lon1, lat2, lon2) > ANTIPODAL_GUARD_KM
+    for i in np.flatnonzero(~converged | ~np.isfinite(distance) | near_antipodal):
+        distance.flat[i] = calculate_distance_km(lat1.flat[i], lon1.flat[i], lat2.flat[i], lon2.flat[i])
+    return distance
+
+DISTANCE_METHODS = {
+    'geodesic': vincenty_km,
+    'haversine': haversine_km
+}
+
+# Batch counterpart of calculate_distance_km over arrays of coordinates
+@profiled()
+def calculate_distance_km_batch(lat1, lon1, lat2, lon2, method='geodesic'):
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Unknown distance method: {method!r} (expected one of {sorted(DISTANCE_METHODS)})")
+    return DISTANCE_METHODS[method](lat1, lon1, lat2, lon2)
+
+# Batch counterpart of estimate_emission; modes is an array-like of mode names
+# or a pandas Categorical (whose codes are used directly)
+@profiled()
+def estimate_emission_batch(distance_km, modes):
+    distance_km = np.asarray(distance_km, dtype=float)
+    if hasattr(modes, 'codes'):
+        unique_modes, inverse = modes.categories, np.asarray(modes.codes)
+    else:
+        unique_modes, inverse = np.unique(np.asarray(modes, dtype=object).astype(str), return_inverse=True)
+    factors = np.array([EMISSION_FACTORS.get(m, DEFAULT_FACTOR) for m in unique_modes], dtype=float)
+    return distance_km * factors[inverse.reshape(distance_km.shape)]
@@ -0,0 +1,226 @@
+# emission_cache.py (Columnar Parquet cache of the parsed emission DataFrame)
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from time_series import build_emission_frame, compact_frame, iter_entries
+from trip_store import read_since
+from profiling import profiled
+
+CACHE_DIR = 'data/cache'
+CACHE_VERSION = 2
+HASH_WINDOW = 4096  # bytes hashed at the head and at the cached offset
+MAX_PARTS = 32      # compact the cache once this many increments pile up
+LOCK_NAME = '.lock'
+
+_held = threading.local()  # lock files this thread already holds
+
+
+# Hold the cache directory's lock file for the duration of the block. The
+# collector, dashboard, API and report all update and read the same cache (and
+# the rollups and partitions derived from it), so part writes, compactions and
+# the derived tables are serialized across processes with flock; threads take
+# their own descriptor and so exclude each other too. Re-entrant per thread.
+@contextmanager
+def cache_lock(cache_dir=CACHE_DIR):
+    path = os.path.abspath(os.path.join(cache_dir, LOCK_NAME))
+    held = _held.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+
+
+def _hash_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+# Cheap identity of a source file: size, mtime and a hash of its first bytes
+def fingerprint(path):
+    stat = os.stat(path)
+    head = _hash_range(path, 0, min(stat.st_size, HASH_WINDOW))
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{head}"
+
+
+def _cache_paths(source, cache_dir):
+    name = os.path.basename(source).replace('.', '_')
+    parts_dir = os.path.join(cache_dir, name)
+    return parts_dir, os.path.join(cache_dir, f"{name}.meta.json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, meta_path)
+
+
+def _write_part(parts_dir, index, df):
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    pq.write_table(table, os.path.join(parts_dir, f"part-{index:05d}.parquet"))
+
+
+# compact=True reads mode and user as dictionary columns, so they arrive as
+# categoricals without materialising a string per row. Rows before `start` are
+# skipped; parts that hold only such rows are never opened past their footer.
+def _read_parts(parts_dir, compact=False, start=0):
+    paths = sorted(os.path.join(parts_dir, p) for p in os.listdir(parts_dir) if p.endswith('.parquet'))
+    read_dictionary = ['transport_mode', 'user_id'] if compact else None
+    tables = []
+    for path in paths:
+        if start:
+            rows = pq.read_metadata(path).num_rows
+            if rows <= start:
+                start -= rows
+                continue
+        tables.append(pq.read_table(path, memory_map=True, read_dictionary=read_dictionary).slice(start))
+        start = 0
+    df = pa.concat_tables(tables).to_pandas() if tables else pd.DataFrame(
+        columns=['datetime', 'emission_kg', 'transport_mode', 'user_id'])
+    df = df.set_index('datetime')
+    return compact_frame(df, report=False) if compact else df
+
+
+# Re-parse the whole source and replace the cache with a single part. The
+# fingerprint is taken before reading: lines appended meanwhile then change it,
+# and the next load picks them up past the stored offset.
+def _rebuild(source, parts_dir, meta_path, distance_method):
+    source_fingerprint = fingerprint(source)
+    if source.endswith('.jsonl'):
+        entries, offset = read_since(source, 0)
+    else:
+        entries, offset = iter_entries(source), os.path.getsize(source)
+    df = build_emission_frame(entries, distance_method=distance_method)
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    _write_part(parts_dir, 0, df)
+    _write_meta(meta_path, {
+        'version': CACHE_VERSION,
+        'build_id': uuid.uuid4().hex,
+        'source': os.path.abspath(source),
+        'distance_method': distance_method,
+        'fingerprint': source_fingerprint,
+        'offset': offset,
+        'head_hash': _hash_range(source, 0, min(offset, HASH_WINDOW)),
+        'tail_hash': _hash_range(source, max(0, offset - HASH_WINDOW), offset),
+        'parts': 1,
+        'rows': len(df)
+    })
+    return df
+
+
+# An append-only JSONL source can be extended when the bytes we already
+# cached are unchanged and only new lines follow them
+def _can_extend(source, meta):
+    if not source.endswith('.jsonl'):
+        return False
+    offset = meta['offset']
+    if os.path.getsize(source) < offset:
+        return False
+    if _hash_range(source, 0, min(offset, HASH_WINDOW)) != meta['head_hash']:
+        return False
+    return _hash_range(source, max(0, offset - HASH_WINDOW), offset) == meta['tail_hash']
+
+
+# Metadata of the current cache for a source (None before the first load);
+# build_id changes whenever the cache is rebuilt rather than extended
+def cache_state(source, cache_dir=CACHE_DIR):
+    return _read_meta(_cache_paths(source, cache_dir)[1])
+
+
+# Bring the cache of a source up to date, parsing only what is new. Returns the
+# cache metadata and, when the update built the whole frame in memory anyway
+# (a rebuild or a compaction), that frame; else None.
+def _update(source, cache_dir, distance_method):
+    os.makedirs(cache_dir, exist_ok=True)
+    parts_dir, meta_path = _cache_paths(source, cache_dir)
+    meta = _read_meta(meta_path)
+
+    valid = (
+        meta is not None
+        and meta.get('version') == CACHE_VERSION
+        and meta.get('source') == os.path.abspath(source)
+        and meta.get('distance_method') == distance_method
+        and os.path.isdir(parts_dir)
+    )
+    if not valid:
+        df = _rebuild(source, parts_dir, meta_path, distance_method)
+        return _read_meta(meta_path), df
+
+    source_fingerprint = fingerprint(source)
+    if meta['fingerprint'] == source_fingerprint:
+        return meta, None
+
+    if not _can_extend(source, meta):
+        df = _rebuild(source, parts_dir, meta_path, distance_method)
+        return _read_meta(meta_path), df
+
+    entries, offset = read_since(source, meta['offset'])
+    if entries:
+        new_df = build_emission_frame(entries, distance_method=distance_method)
+        _write_part(parts_dir, meta['parts'], new_df)
+        meta['parts'] += 1
+        meta['rows'] += len(new_df)
+    meta['offset'] = offset
+    meta['head_hash'] = _hash_range(source, 0, min(offset, HASH_WINDOW))
+    meta['tail_hash'] = _hash_range(source, max(0, offset - HASH_WINDOW), offset)
+    meta['fingerprint'] = source_fingerprint
+
+    df = None
+    if meta['parts'] > MAX_PARTS:
+        df = _read_parts(parts_dir)
+        shutil.rmtree(parts_dir)
+        os.makedirs(parts_dir)
+        _write_part(parts_dir, 0, df)
+        meta['parts'] = 1
+    _write_meta(meta_path, meta)
+    return meta, df
+
+
+# Bring the cache up to date without reading it back; returns its metadata
+def update_cache(source, cache_dir=CACHE_DIR, distance_method='geodesic'):
+    with cache_lock(cache_dir):
+        return _update(source, cache_dir, distance_method)[0]
+
+
+# Rows of the cached frame from row `start` on (row positions are stable for
+# as long as build_id is); only the parts that hold them are read
+def read_cached_rows(source, start=0, cache_dir=CACHE_DIR, compact=False):
+    with cache_lock(cache_dir):
+        return _read_parts(_cache_paths(source, cache_dir)[0], compact, start)
+
+
+# Load the emission frame through the cache, parsing only what is new
+@profiled()
+def load_emission_data_cached(source, cache_dir=CACHE_DIR, distance_method='geodesic', compact=False):
+    with cache_lock(cache_dir):
+        _, df = _update(source, cache_dir, distance_method)
+        if df is None:
+            return read_cached_rows(source, cache_dir=cache_dir, compact=compact)
+    return compact_frame(df, report=False) if compact else df
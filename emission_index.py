@@ -0,0 +1,116 @@
+# emission_index.py (In-memory range-query index over the daily rollup)
+
+import numpy as np
+import pandas as pd
+
+
+def _day(value):
+    value = pd.Timestamp(value)
+    if value.tz is not None:
+        value = value.tz_convert('UTC').tz_localize(None)
+    return int(value.floor('D').value // 86_400_000_000_000)
+
+
+def _timestamps(days):
+    return pd.to_datetime(np.asarray(days, dtype='int64') * 86_400, unit='s', utc=True)
+
+
+# Built once per data version from a rollup. For each mode it keeps the sorted
+# days with trips and the running sum of their emissions, so a date range x
+# mode set total is two binary searches per mode; daily series and top days
+# are read from the same arrays. Days are whole UTC days (int days since epoch).
+class EmissionIndex:
+    def __init__(self, rollup):
+        per_day = rollup.groupby(['transport_mode', 'date'], observed=True)['emission_kg'].sum()
+        self._days, self._emission, self._prefix = {}, {}, {}
+        for mode, group in per_day.groupby(level='transport_mode', observed=True):
+            dates = pd.DatetimeIndex(group.index.get_level_values('date'))
+            if dates.tz is not None:
+                dates = dates.tz_convert('UTC').tz_localize(None)
+            days = dates.values.astype('datetime64[D]').astype('int64')
+            order = np.argsort(days, kind='stable')
+            emission = group.to_numpy(dtype='float64')[order]
+            self._days[mode] = days[order]
+            self._emission[mode] = emission
+            self._prefix[mode] = np.concatenate([[0.0], np.cumsum(emission)])
+        self.modes = sorted(self._days)
+
+    def _bounds(self, mode, start, end):
+        days = self._days[mode]
+        lo = 0 if start is None else int(np.searchsorted(days, _day(start), 'left'))
+        hi = len(days) if end is None else int(np.searchsorted(days, _day(end), 'right'))
+        return lo, hi
+
+    def _selected(self, modes):
+        return self.modes if modes is None else [mode for mode in modes if mode in self._days]
+
+    # Total emissions over an inclusive date range and a set of modes (None = all)
+    def total(self, start=None, end=None, modes=None):
+        total = 0.0
+        for mode in self._selected(modes):
+            lo, hi = self._bounds(mode, start, end)
+            total += self._prefix[mode][hi] - self._prefix[mode][lo]
+        return total
+
+    # Per-mode totals, largest first, shaped like rollup.totals_by(rollup, 'transport_mode')
+    def totals_by_mode(self, start=None, end=None, modes=None):
+        totals = {}
+        for mode in self._selected(modes):
+            lo, hi = self._bounds(mode, start, end)
+            if hi > lo:
+                totals[mode] = self._prefix[mode][hi] - self._prefix[mode][lo]
+        return pd.Series(totals, dtype='float64', name='emission_kg').rename_axis('transport_mode').sort_values(ascending=False)
+
+    # Modes with at least one trip in the range
+    def modes_in(self, start=None, end=None):
+        modes = []
+        for mode in self.modes:
+            lo, hi = self._bounds(mode, start, end)
+            if hi > lo:
+                modes.append(mode)
+        return modes
+
+    # First and last day with trips in the range, or None when there are none
+    def span(self, start=None, end=None, modes=None):
+        first, last = None, None
+        for mode in self._selected(modes):
+            lo, hi = self._bounds(mode, start, end)
+            if hi > lo:
+                days = self._days[mode]
+                first = days[lo] if first is None else min(first, days[lo])
+                last = days[hi - 1] if last is None else max(last, days[hi - 1])
+        return None if first is None else (int(first), int(last))
+
+    # Daily totals between the first and last day with trips, empty days as 0;
+    # the same frame rollup.daily_totals gives for the filtered rollup
+    def daily(self, start=None, end=None, modes=None):
+        span = self.span(start, end, modes)
+        if span is None:
+            return pd.DataFrame({'emission_kg': pd.Series(dtype='float64')},
+                                index=pd.DatetimeIndex([], tz='UTC', name='datetime'))
+        first, last = span
+        values = np.zeros(last - first + 1)
+        for mode in self._selected(modes):
+            lo, hi = self._bounds(mode, start, end)
+            np.add.at(values, self._days[mode][lo:hi] - first, self._emission[mode][lo:hi])
+        index = _timestamps(np.arange(first, last + 1)).rename('datetime')
+        return pd.DataFrame({'emission_kg': values}, index=index)
+
+    # Emissions of the last `days` days of the range that have trips up to them
+    # (daily(...).tail(days)), in O(log n) per mode
+    def recent_total(self, days=7, start=None, end=None, modes=None):
+        span = self.span(start, end, modes)
+        if span is None:
+            return 0.0
+        last = span[1]
+        first = max(span[0], last - days + 1)
+        return self.total(_timestamps([first])[0], _timestamps([last])[0], modes)
+
+    # The k highest-emission days as a (datetime, emission_kg) frame, largest
+    # first, ties by date. Nothing is precomputed for this: a day's total is a
+    # sum over the selected modes, so merging per-mode rankings reads most of
+    # them anyway; the range's daily series (empty days included) is ranked whole
+    def top_days(self, k=5, start=None, end=None, modes=None):
+        daily = self.daily(start, end, modes)
+        best = np.argsort(-daily['emission_kg'].to_numpy(), kind='stable')[:k]
+        return daily.iloc[best].reset_index()
@@ -0,0 +1,116 @@
+# forecaster.py (Persistent Prophet forecaster with warm-started refits)
+
+import json
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+from time_series import prophet_history
+from profiling import profiled
+
+MODEL_DIR = 'data/models'
+
+# One lock per model file: sessions of the dashboard and requests of the API
+# fit the same named model from different threads
+_model_locks = {}
+_model_locks_guard = threading.Lock()
+
+
+def _model_lock(path):
+    with _model_locks_guard:
+        return _model_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+# Fitted parameters of a previous model, in the form Prophet.fit(init=...) takes
+def stan_init(model):
+    res = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        res[pname] = model.params[pname][0][0]
+    for pname in ['delta', 'beta']:
+        res[pname] = model.params[pname][0]
+    return res
+
+
+def _history_hash(df_daily):
+    return str(pd.util.hash_pandas_object(df_daily, index=False).sum())
+
+
+# Keeps the last fitted model on disk. An unchanged history reuses it as is;
+# a changed history is refitted starting from the stored parameters. The model
+# and its metadata share one file, replaced atomically, and fits of the same
+# name are serialized so concurrent callers never see half of a save.
+class PersistentForecaster:
+    def __init__(self, name='forecast', model_dir=MODEL_DIR):
+        self.model_path = os.path.join(model_dir, f"{name}.json")
+        self.model = None
+        self.metrics = {}
+
+    def _load(self):
+        if not os.path.exists(self.model_path):
+            return None, {}
+        from prophet.serialize import model_from_json
+        with open(self.model_path) as f:
+            saved = json.load(f)
+        if 'model' not in saved:  # written before model and metadata shared a file
+            return None, {}
+        return model_from_json(saved['model']), saved['meta']
+
+    def _save(self, model, meta):
+        from prophet.serialize import model_to_json
+        directory = os.path.dirname(self.model_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump({'meta': meta, 'model': model_to_json(model)}, f)
+        os.replace(f.name, self.model_path)
+
+    @profiled('forecaster.PersistentForecaster.fit')
+    def fit(self, df):
+        with _model_lock(self.model_path):
+            return self._fit(df)
+
+    def _fit(self, df):
+        from prophet import Prophet
+        df_daily = prophet_history(df)
+        history_hash = _history_hash(df_daily)
+        previous, meta = self._load()
+
+        start = time.perf_counter()
+        if previous is not None and meta.get('history_hash') == history_hash:
+            self.model, mode = previous, 'reused'
+        else:
+            self.model, mode = None, 'cold'
+            if previous is not None:
+                # Parameter shapes change with the changepoint count or seasonalities;
+                # fall back to a cold fit when the previous model no longer lines up
+                try:
+                    self.model = Prophet().fit(df_daily, init=stan_init(previous))
+                    mode = 'warm'
+                except Exception:
+                    self.model = None
+            if self.model is None:
+                self.model = Prophet().fit(df_daily)
+        fit_seconds = time.perf_counter() - start
+
+        self.metrics = {
+            'mode': mode,
+            'fit_seconds': round(fit_seconds, 4),
+            'history_days': len(df_daily),
+            'previous_cold_fit_seconds': meta.get('cold_fit_seconds')
+        }
+        if mode != 'reused':
+            meta = {
+                'history_hash': history_hash,
+                'history_days': len(df_daily),
+                'last_mode': mode,
+                'last_fit_seconds': round(fit_seconds, 4),
+                'cold_fit_seconds': round(fit_seconds, 4) if mode == 'cold' else meta.get('cold_fit_seconds')
+            }
+            self._save(self.model, meta)
+        return self.model
+
+    # Same return shape as time_series.forecast_emissions
+    def forecast(self, df, days=7):
+        model = self.fit(df)
+        future = model.make_future_dataframe(periods=days)
+        return model, model.predict(future)
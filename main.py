@@ -1,117 +1,202 @@
 # main.py
 
-from time_series import load_emission_data, forecast_emissions, detect_anomalies
-from visualize import plot_forecast, plot_anomalies
-from emission import calculate_distance_km, estimate_emission
-import matplotlib.pyplot as plt
+from trip_store import resolve_data_file
+from emission_cache import load_emission_data_cached
+from rollup import load_rollup, build_rollup_chunked, totals_by, daily_by_mode
+from time_series import (ANOMALY_ENGINES, forecast_emissions_by_group, detect_anomalies, frame_memory_mb,
+                         report_compact_memory)
+from forecaster import PersistentForecaster
+from visualize import (plot_forecast, plot_anomalies, plot_emissions_by_mode,
+                       plot_daily_emissions_stacked, plot_emissions_by_user)
+from render import Chart, RenderPipeline
+from emission_index import EmissionIndex
+from summarize import OFFSET_COST_PER_KG, SummaryService, default_backend, group_stats, summary_stats
+import profiling
+from distance_index import default_index
+import argparse
+import json
 import os
 
-# -----------------------------------
-# Setup Directories
-# -----------------------------------
-os.makedirs('plots', exist_ok=True)
-os.makedirs('data', exist_ok=True)
-
-# -----------------------------------
-# 1. Load Emission Data
-# -----------------------------------
-df = load_emission_data('data/data.json')
-print("Loaded Data Sample:\n", df.head())
-
-# -----------------------------------
-# 2. Emissions by Transport Mode
-# -----------------------------------
-emissions_by_mode = df.groupby('transport_mode')['emission_kg'].sum().sort_values(ascending=False)
-print("\nTotal Emissions by Transport Mode:\n", emissions_by_mode)
-
-# Plot Emissions by Mode
-emissions_by_mode.plot(kind='bar', title='Total Emissions by Transport Mode', figsize=(8,5))
-plt.ylabel('Emissions (kg CO2)')
-plt.xlabel('Transport Mode')
-plt.tight_layout()
-plt.savefig('plots/emissions_by_mode.png')
-plt.close()
-
-# -----------------------------------
-# 3. Daily Emissions by Transport Mode (Stacked Bar)
-# -----------------------------------
-daily_mode = df.groupby([df.index.date, 'transport_mode']).sum().unstack().fillna(0)
-daily_mode.columns = daily_mode.columns.droplevel()
-daily_mode.plot(kind='bar', stacked=True, figsize=(12,6), title='Daily Emissions by Transport Mode')
-plt.ylabel('Emissions (kg CO2)')
-plt.tight_layout()
-plt.savefig('plots/daily_emissions_stacked.png')
-plt.close()
-
-# -----------------------------------
-# 4. Emissions by User
-# -----------------------------------
-emissions_by_user = df.groupby('user_id')['emission_kg'].sum().sort_values(ascending=False)
-print("\nTotal Emissions by User:\n", emissions_by_user)
-
-# Plot Emissions by User
-emissions_by_user.plot(kind='bar', title='Total Emissions by User', figsize=(8,5), color='green')
-plt.ylabel('Emissions (kg CO2)')
-plt.xlabel('User ID')
-plt.tight_layout()
-plt.savefig('plots/emissions_by_user.png')
-plt.close()
-
-# Save emissions by user to CSV
-emissions_by_user.to_csv('data/emissions_by_user.csv')
-
-# -----------------------------------
-# 5. Forecast Emissions (Next 7 Days)
-# -----------------------------------
-model, forecast = forecast_emissions(df)
-plot_forecast(model, forecast, save_path='plots/forecast.png')
-
-# -----------------------------------
-# 6. Detect Anomalies
-# -----------------------------------
-df_anomalies = detect_anomalies(df)
-plot_anomalies(df_anomalies, save_path='plots/anomalies.png')
-
-# -----------------------------------
-# 7. Summary Generation + Carbon Offset
-# -----------------------------------
-total_emission = df['emission_kg'].sum()
-recent = df.resample('D').sum().tail(7)
-recent_total = recent['emission_kg'].sum()
-anomaly_days = df_anomalies[df_anomalies['anomaly'] == -1].shape[0]
-
-offset_cost_per_kg = 0.01  # $0.01 per kg CO2
-total_offset_cost = total_emission * offset_cost_per_kg
-
-summary_text = (
-    f"Summary Report:\n"
-    f"In the last 7 days, total emissions were {recent_total:.2f} kg CO2.\n"
-    f"Total emissions over 30 days: {total_emission:.2f} kg CO2.\n"
-    f"{anomaly_days} anomaly days were detected.\n"
-    f"Estimated Carbon Offset Cost: ${total_offset_cost:.2f} (at ${offset_cost_per_kg:.2f} per kg CO2)\n"
-    f"Suggested Action: Investigate the anomaly days for unusual travel patterns or data errors. "
-    f"Consider strategies to reduce emissions on high-output days."
-)
-
-print("\n📝 Summary:\n", summary_text)
-
-with open('data/emission_summary.txt', 'w') as f:
-    f.write(summary_text)
-
-# -----------------------------------
-# 8. Markdown Report Generator
-# -----------------------------------
-with open('report.md', 'w') as f:
-    f.write("# Emission Analysis Report\n\n")
-    f.write(f"**Total Emissions (30 days):** {total_emission:.2f} kg CO₂\n\n")
-    f.write(f"**Last 7 Days Emissions:** {recent_total:.2f} kg CO₂\n\n")
-    f.write(f"**Anomaly Days Detected:** {anomaly_days}\n\n")
-    f.write(f"**Carbon Offset Estimate:** ${total_offset_cost:.2f}\n\n")
-    f.write("## Summary\n\n")
-    f.write(summary_text + "\n\n")
-    f.write("## Visualizations\n\n")
-    f.write("![Emissions by Mode](plots/emissions_by_mode.png)\n\n")
-    f.write("![Daily Emissions](plots/daily_emissions_stacked.png)\n\n")
-    f.write("![Emissions by User](plots/emissions_by_user.png)\n\n")
-    f.write("![Forecast](plots/forecast.png)\n\n")
-    f.write("![Anomalies](plots/anomalies.png)\n")
+# Charts embedded in report.md, in order: (name, caption); images live at plots/<name>.png
+REPORT_CHARTS = [
+    ('emissions_by_mode', 'Emissions by Mode'),
+    ('daily_emissions_stacked', 'Daily Emissions'),
+    ('emissions_by_user', 'Emissions by User'),
+    ('forecast', 'Forecast'),
+    ('anomalies', 'Anomalies'),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the emission report and plots.')
+    parser.add_argument('--grouped-forecast', choices=['user_id', 'transport_mode'],
+                        help='also forecast each user or transport mode separately')
+    parser.add_argument('--workers', type=int, default=None, help='processes for grouped forecasts')
+    parser.add_argument('--series-timeout', type=float, default=None, help='seconds allowed per grouped forecast')
+    parser.add_argument('--render-workers', type=int, default=None, help='processes for chart rendering')
+    parser.add_argument('--compact', action='store_true',
+                        help='load trips with categorical mode/user and float32 emissions')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='aggregate the trip history in batches of this many trips instead of loading it whole')
+    parser.add_argument('--profile', action='store_true',
+                        help='record stage timings (also enabled by BVG_PROFILE=1)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='also trace peak memory per stage; slows the run (also BVG_PROFILE=memory)')
+    parser.add_argument('--anomaly-engine', choices=sorted(ANOMALY_ENGINES), default='isolation_forest',
+                        help='anomaly detection engine')
+    parser.add_argument('--summary-backend', choices=['auto', 'openai', 'stub', 'none'], default=None,
+                        help='LLM used for summaries (default: SUMMARY_BACKEND or auto); the template is used without one')
+    parser.add_argument('--summary-timeout', type=float, default=10, help='seconds to wait for LLM summaries')
+    parser.add_argument('--summaries-by', choices=['user_id', 'transport_mode'],
+                        help='also summarize each user or transport mode separately')
+    return parser.parse_args(argv)
+
+
+def main(args):
+    if args.profile or args.profile_memory:
+        profiling.enable(memory=args.profile_memory)
+
+    # -----------------------------------
+    # Setup Directories
+    # -----------------------------------
+    os.makedirs('plots', exist_ok=True)
+    os.makedirs('data', exist_ok=True)
+
+    # Charts render in the background; unchanged ones are skipped
+    renderer = RenderPipeline(max_workers=args.render_workers)
+
+    # -----------------------------------
+    # 1. Load Emission Data
+    # -----------------------------------
+    data_file = resolve_data_file()
+    if args.chunk_size:
+        # Out-of-core: the trip frame is never built in full
+        rollup = build_rollup_chunked(data_file, chunk_size=args.chunk_size)
+        print(f"Aggregated trips in batches of {args.chunk_size}")
+    else:
+        df = load_emission_data_cached(data_file, compact=args.compact)
+        print("Loaded Data Sample:\n", df.head())
+        if args.compact:
+            report_compact_memory(df)
+        else:
+            print(f"Emission frame memory: {frame_memory_mb(df):.2f} MB")
+
+        # Daily x mode x user aggregates, shared by every section below
+        rollup = load_rollup(data_file)
+    # Range-query index: the daily series and summary totals without rescanning the rollup
+    index = EmissionIndex(rollup)
+    daily = index.daily()
+
+    index_stats = default_index().stats()
+    if index_stats['hits'] or index_stats['misses']:
+        print("Distance index:", index_stats)
+
+    # -----------------------------------
+    # 2. Emissions by Transport Mode
+    # -----------------------------------
+    emissions_by_mode = totals_by(rollup, 'transport_mode')
+    print("\nTotal Emissions by Transport Mode:\n", emissions_by_mode)
+
+    # Plot Emissions by Mode
+    renderer.submit(Chart('emissions_by_mode', 'plots/emissions_by_mode.png', plot_emissions_by_mode,
+                          args=(emissions_by_mode,), key=(emissions_by_mode,)))
+
+    # -----------------------------------
+    # 3. Daily Emissions by Transport Mode (Stacked Bar)
+    # -----------------------------------
+    daily_mode = daily_by_mode(rollup)
+    daily_mode.index = daily_mode.index.date
+    renderer.submit(Chart('daily_emissions_stacked', 'plots/daily_emissions_stacked.png', plot_daily_emissions_stacked,
+                          args=(daily_mode,), key=(daily_mode,)))
+
+    # -----------------------------------
+    # 4. Emissions by User
+    # -----------------------------------
+    emissions_by_user = totals_by(rollup, 'user_id')
+    print("\nTotal Emissions by User:\n", emissions_by_user)
+
+    # Plot Emissions by User
+    renderer.submit(Chart('emissions_by_user', 'plots/emissions_by_user.png', plot_emissions_by_user,
+                          args=(emissions_by_user,), key=(emissions_by_user,)))
+
+    # Save emissions by user to CSV
+    emissions_by_user.to_csv('data/emissions_by_user.csv')
+
+    # -----------------------------------
+    # 5. Forecast Emissions (Next 7 Days)
+    # -----------------------------------
+    forecaster = PersistentForecaster('report')
+    model, forecast = forecaster.forecast(daily)
+    print("\nForecast fit:", forecaster.metrics)
+    renderer.submit(Chart('forecast', 'plots/forecast.png', plot_forecast,
+                          # uncertainty bounds are sampled, so only the point forecast keys the chart
+                          args=(model, forecast), key=(daily, forecast[['ds', 'yhat']])))
+
+    # Optional per-user / per-mode forecasts, fitted in parallel
+    if args.grouped_forecast:
+        grouped = forecast_emissions_by_group(rollup.set_index('date'), args.grouped_forecast,
+                                              max_workers=args.workers, timeout=args.series_timeout)
+        grouped.to_csv(f'data/forecast_by_{args.grouped_forecast}.csv', index=False)
+        print(f"\nForecasts by {args.grouped_forecast}:\n", grouped.groupby(args.grouped_forecast).tail(1))
+
+    # -----------------------------------
+    # 6. Detect Anomalies
+    # -----------------------------------
+    df_anomalies = detect_anomalies(daily, engine=args.anomaly_engine, name='report')
+    renderer.submit(Chart('anomalies', 'plots/anomalies.png', plot_anomalies,
+                          args=(df_anomalies,), key=(df_anomalies,)))
+
+    # -----------------------------------
+    # 7. Summary Generation + Carbon Offset
+    # -----------------------------------
+    stats = summary_stats(df_anomalies, index=index)
+    total_emission = stats['total']
+    recent_total = stats['week_total']
+    anomaly_days = stats['anomaly_count']
+    total_offset_cost = total_emission * OFFSET_COST_PER_KG
+
+    # Cached by the statistics above; falls back to the template without a backend
+    summaries = SummaryService(default_backend(args.summary_backend), timeout=args.summary_timeout)
+    summary_text = summaries.summarize(stats)
+
+    print("\n📝 Summary:\n", summary_text)
+
+    with open('data/emission_summary.txt', 'w') as f:
+        f.write(summary_text)
+
+    if args.summaries_by:
+        group_summaries = summaries.summarize_many(group_stats(rollup, args.summaries_by, engine=args.anomaly_engine))
+        with open(f'data/summaries_by_{args.summaries_by}.json', 'w') as f:
+            json.dump(group_summaries, f, indent=4)
+        print(f"\nSummaries by {args.summaries_by}: {len(group_summaries)} written")
+    print("Summary cache:", summaries.stats())
+    summaries.close()
+
+    # -----------------------------------
+    # 8. Markdown Report Generator
+    # -----------------------------------
+    with profiling.stage('render.wait_for_report_charts'):
+        renderer.wait([name for name, _ in REPORT_CHARTS])
+    # Every chart is finished first so the profile has each one's render time
+    render_times = renderer.close()
+    stages = profiling.write_profile() if profiling.is_enabled() else None
+    with open('report.md', 'w') as f:
+        f.write("# Emission Analysis Report\n\n")
+        f.write(f"**Total Emissions (30 days):** {total_emission:.2f} kg CO₂\n\n")
+        f.write(f"**Last 7 Days Emissions:** {recent_total:.2f} kg CO₂\n\n")
+        f.write(f"**Anomaly Days Detected:** {anomaly_days}\n\n")
+        f.write(f"**Carbon Offset Estimate:** ${total_offset_cost:.2f}\n\n")
+        f.write("## Summary\n\n")
+        f.write(summary_text + "\n\n")
+        f.write("## Visualizations\n\n")
+        f.write("\n\n".join(f"![{caption}](plots/{name}.png)" for name, caption in REPORT_CHARTS) + "\n")
+        if stages:
+            f.write("\n" + profiling.markdown_section(stages))
+
+    print("\nChart rendering:")
+    for name, result in render_times.items():
+        print(f"  {name}: {result['status']} ({result['seconds']:.2f}s)")
+
+
+if __name__ == '__main__':
+    main(parse_args())
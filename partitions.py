@@ -0,0 +1,73 @@
+# partitions.py (Month-partitioned Parquet copy of the emission frame for date-range queries)
+
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from emission_cache import CACHE_DIR, cache_lock, read_cached_rows, update_cache
+from profiling import profiled
+from time_series import PARTITION_DIR
+
+ROW_GROUP_ROWS = 16_384  # smaller row groups let the datetime filter skip more of a month
+
+
+def partition_dir_for(source, partition_root=PARTITION_DIR):
+    return os.path.join(partition_root, os.path.basename(source).replace('.', '_'))
+
+
+def _write_month(partition_dir, month, df):
+    table = pa.Table.from_pandas(df.sort_index().reset_index(), preserve_index=False)
+    path = os.path.join(partition_dir, f"{month}.parquet")
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp_path, path)
+
+
+def _read_month(partition_dir, month):
+    path = os.path.join(partition_dir, f"{month}.parquet")
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path).to_pandas().set_index('datetime')
+
+
+# Bring the month partitions of a source up to date and return their directory.
+# Only the cached rows added since the last call are read, and only the months
+# they fall in are rewritten (their existing rows plus the new ones); a rebuilt
+# emission cache rewrites them all. Runs under the cache lock, like load_rollup.
+@profiled()
+def update_partitions(source, partition_root=PARTITION_DIR, cache_dir=CACHE_DIR):
+    with cache_lock(cache_dir):
+        return _update_partitions(source, partition_root, cache_dir)
+
+
+def _update_partitions(source, partition_root, cache_dir):
+    partition_dir = partition_dir_for(source, partition_root)
+    meta_path = partition_dir + '.meta.json'
+    meta = None
+    if os.path.isdir(partition_dir) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    state = update_cache(source, cache_dir)
+    extend = meta is not None and meta['build_id'] == state['build_id'] and meta['rows'] <= state['rows']
+    if extend and meta['rows'] == state['rows']:
+        return partition_dir
+
+    if extend:
+        new_rows = read_cached_rows(source, meta['rows'], cache_dir)
+    else:
+        shutil.rmtree(partition_dir, ignore_errors=True)
+        new_rows = read_cached_rows(source, cache_dir=cache_dir)
+    os.makedirs(partition_dir, exist_ok=True)
+
+    for month, rows in new_rows.groupby(new_rows.index.strftime('%Y-%m')):
+        existing = _read_month(partition_dir, month) if extend else None
+        _write_month(partition_dir, month, rows if existing is None else pd.concat([existing, rows]))
+
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'build_id': state['build_id'], 'rows': state['rows']}, f, indent=4)
+    os.replace(tmp_path, meta_path)
+    return partition_dir
@@ -0,0 +1,166 @@
+# profiling.py (Opt-in stage timing and peak memory for the pipeline)
+#
+# Enable timing with BVG_PROFILE=1 or profiling.enable(); when disabled,
+# instrumented functions pay a single flag check per call. Peak memory is a
+# separate opt-in (BVG_PROFILE=memory or enable(memory=True)): tracemalloc
+# slows allocation-heavy code several-fold, so a memory run's timings are not
+# the ones to compare.
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+PROFILE_FILE = 'data/profile.json'
+
+_mode = os.environ.get('BVG_PROFILE', '').lower()
+_enabled = _mode in ('1', 'true', 'yes', 'memory')
+_memory = _mode == 'memory'
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(memory=False):
+    global _enabled, _memory
+    _enabled = True
+    _memory = _memory or memory
+
+
+def is_enabled():
+    return _enabled
+
+
+def traces_memory():
+    return _memory
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+# Times one stage with perf_counter
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Times one stage and tracks its peak traced memory; nested stages report
+# their own peak and also count towards their parent's
+class _MemoryStage(_Stage):
+    def __enter__(self):
+        current, peak = tracemalloc.get_traced_memory()
+        stack = _stack()
+        if stack:
+            stack[-1]['max'] = max(stack[-1]['max'], peak)
+        tracemalloc.reset_peak()
+        stack.append({'start_mem': current, 'max': 0})
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _, peak = tracemalloc.get_traced_memory()
+        stack = _stack()
+        frame = stack.pop()
+        frame_peak = max(frame['max'], peak)
+        if stack:
+            stack[-1]['max'] = max(stack[-1]['max'], frame_peak)
+        tracemalloc.reset_peak()
+        record(self.name, seconds, max(0, frame_peak - frame['start_mem']) / 2 ** 20)
+        return False
+
+
+# Record a stage timed elsewhere, e.g. a chart rendered in a worker process
+def record(name, seconds, peak_mb=None):
+    if not _enabled:
+        return
+    with _lock:
+        _records.append({'stage': name, 'seconds': seconds, 'peak_mb': peak_mb})
+
+
+# Context manager: `with stage('load'):`
+def stage(name):
+    if not _enabled:
+        return _NULL_STAGE
+    if not _memory:
+        return _Stage(name)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _MemoryStage(name)
+
+
+# Decorator: `@profiled()` records each call under module.function
+def profiled(name=None):
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Per-stage totals in first-seen order; peak_mb is None unless memory was traced
+def summary():
+    stages = {}
+    with _lock:
+        for item in _records:
+            entry = stages.setdefault(item['stage'], {'stage': item['stage'], 'calls': 0,
+                                                      'seconds': 0.0, 'peak_mb': None})
+            entry['calls'] += 1
+            entry['seconds'] += item['seconds']
+            if item['peak_mb'] is not None:
+                entry['peak_mb'] = max(entry['peak_mb'] or 0.0, item['peak_mb'])
+    return [dict(e, seconds=round(e['seconds'], 4), peak_mb=None if e['peak_mb'] is None else round(e['peak_mb'], 2))
+            for e in stages.values()]
+
+
+def write_profile(path=PROFILE_FILE):
+    stages = summary()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'timestamp': datetime.now(timezone.utc).isoformat(), 'memory_traced': _memory,
+                   'stages': stages}, f, indent=4)
+    return stages
+
+
+def markdown_section(stages):
+    lines = ["## Run Profile\n", "| Stage | Calls | Time (s) | Peak memory (MB) |", "|---|---:|---:|---:|"]
+    lines += [f"| {s['stage']} | {s['calls']} | {s['seconds']:.3f} | "
+              f"{'-' if s['peak_mb'] is None else format(s['peak_mb'], '.1f')} |" for s in stages]
+    return "\n".join(lines) + "\n"
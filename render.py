@@ -0,0 +1,95 @@
+# render.py (Parallel, cached chart rendering for report generation)
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import profiling
+
+MANIFEST_FILE = 'plots/.render_manifest.json'
+RENDER_VERSION = 1  # bump to force every chart to re-render
+
+
+# One output image: func(*args, save_path=path), re-rendered only when the
+# frames in `key` (the data the chart is drawn from) change
+class Chart:
+    def __init__(self, name, path, func, args=(), key=()):
+        self.name = name
+        self.path = path
+        self.func = func
+        self.args = args
+        self.key = key
+
+
+def chart_digest(chart):
+    h = hashlib.sha1(f"{RENDER_VERSION}:{chart.func.__module__}.{chart.func.__qualname__}".encode())
+    for frame in chart.key:
+        h.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+        labels = frame.columns if isinstance(frame, pd.DataFrame) else [frame.name]
+        h.update(repr([str(label) for label in labels]).encode())
+    return h.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render(func, args, path):
+    start = time.perf_counter()
+    func(*args, save_path=path)
+    return time.perf_counter() - start
+
+
+# Renders charts on a process pool, skipping those whose image is still current
+class RenderPipeline:
+    def __init__(self, max_workers=None, manifest_path=MANIFEST_FILE):
+        self.manifest_path = manifest_path
+        self.manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        self.pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+        self.pending = {}
+        self.results = {}
+
+    def submit(self, chart):
+        digest = chart_digest(chart)
+        if self.manifest.get(chart.path) == digest and os.path.exists(chart.path):
+            self.results[chart.name] = {'path': chart.path, 'status': 'cached', 'seconds': 0.0}
+        else:
+            future = self.pool.submit(_render, chart.func, chart.args, chart.path)
+            self.pending[chart.name] = (chart.path, digest, future)
+
+    # Block until the named charts are written; other charts keep rendering
+    def wait(self, names):
+        for name in names:
+            if name in self.pending:
+                path, digest, future = self.pending.pop(name)
+                seconds = future.result()
+                self.results[name] = {'path': path, 'status': 'rendered', 'seconds': round(seconds, 4)}
+                # Timed in the worker process, where no stage of this process can see it
+                profiling.record(f"render.{name}", seconds)
+                self.manifest[path] = digest
+        return {name: self.results[name] for name in names}
+
+    def close(self):
+        self.wait(list(self.pending))
+        self.pool.shutdown()
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f, indent=4)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.shutdown(cancel_futures=True)
@@ -0,0 +1,118 @@
+# rollup.py (Daily x mode x user aggregate tables shared by the report and dashboard)
+
+import json
+import os
+import pandas as pd
+from emission_cache import CACHE_DIR, cache_lock, read_cached_rows, update_cache
+from profiling import profiled
+from time_series import build_emission_frame
+from trip_store import iter_batches
+
+ROLLUP_DIR = 'data/rollups'
+KEYS = ['date', 'transport_mode', 'user_id']
+ROLLUP_VERSION = 2  # bump when stored rollups must be rebuilt (2: summed from float64 emissions)
+
+
+# Aggregate raw trips into one row per day, mode and user
+def build_rollup(df):
+    days = df.index.floor('D')
+    rollup = (
+        df.assign(date=days, trips=1, emission_kg=df['emission_kg'].astype('float64'))
+        .groupby(KEYS, observed=True)[['emission_kg', 'trips']]
+        .sum()
+        .reset_index()
+    )
+    return rollup
+
+
+# Fold two rollups together (e.g. history plus the rows of newly landed trips)
+def merge_rollups(left, right):
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    return pd.concat([left, right]).groupby(KEYS, observed=True)[['emission_kg', 'trips']].sum().reset_index()
+
+
+def _paths(source, rollup_dir):
+    name = os.path.basename(source).replace('.', '_')
+    return os.path.join(rollup_dir, f"{name}.parquet"), os.path.join(rollup_dir, f"{name}.meta.json")
+
+
+# Load the rollup for a source, folding in only trips added since the last run.
+# When nothing was added only the cache metadata and the rollup table are read;
+# otherwise only the cached rows past those already folded in. The rollup is
+# updated under the cache lock, so the rows it folds in are exactly state['rows'].
+@profiled()
+def load_rollup(source, rollup_dir=ROLLUP_DIR, cache_dir=CACHE_DIR):
+    with cache_lock(cache_dir):
+        return _load_rollup(source, rollup_dir, cache_dir)
+
+
+def _load_rollup(source, rollup_dir, cache_dir):
+    state = update_cache(source, cache_dir)
+    table_path, meta_path = _paths(source, rollup_dir)
+
+    meta = None
+    if os.path.exists(table_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    if meta and meta.get('version') == ROLLUP_VERSION and meta['build_id'] == state['build_id'] \
+            and meta['rows'] <= state['rows']:
+        if meta['rows'] == state['rows']:
+            return pd.read_parquet(table_path)
+        new_rows = read_cached_rows(source, meta['rows'], cache_dir)
+        rollup = merge_rollups(pd.read_parquet(table_path), build_rollup(new_rows))
+    else:
+        rollup = build_rollup(read_cached_rows(source, cache_dir=cache_dir))
+
+    os.makedirs(rollup_dir, exist_ok=True)
+    rollup.to_parquet(table_path, index=False)
+    with open(meta_path, 'w') as f:
+        json.dump({'version': ROLLUP_VERSION, 'build_id': state['build_id'], 'rows': state['rows']}, f, indent=4)
+    return rollup
+
+
+# Out-of-core rollup: stream trips in fixed-size batches and fold each batch into
+# the running aggregate, so memory is bounded by chunk_size plus the number of
+# day x mode x user rows, however long the history is
+@profiled()
+def build_rollup_chunked(source, chunk_size=100_000, distance_method='geodesic'):
+    rollup = pd.DataFrame(columns=KEYS + ['emission_kg', 'trips'])
+    for batch in iter_batches(source, chunk_size):
+        frame = build_emission_frame(batch, distance_method=distance_method, compact=True, emission_dtype='float64')
+        rollup = merge_rollups(rollup, build_rollup(frame))
+    return rollup
+
+
+# Restrict a rollup to an inclusive date range and a set of modes
+def filter_rollup(rollup, start=None, end=None, modes=None):
+    mask = pd.Series(True, index=rollup.index)
+    if start is not None:
+        mask &= rollup['date'] >= pd.Timestamp(start).floor('D')
+    if end is not None:
+        mask &= rollup['date'] <= pd.Timestamp(end).floor('D')
+    if modes is not None:
+        mask &= rollup['transport_mode'].isin(modes)
+    return rollup[mask]
+
+
+# Daily emission totals with empty days filled, shaped like df.resample('D').sum()
+def daily_totals(rollup):
+    daily = rollup.groupby('date')[['emission_kg']].sum()
+    if not daily.empty:
+        daily = daily.asfreq('D', fill_value=0.0)
+    daily.index.name = 'datetime'
+    return daily
+
+
+# Total emissions per value of one key column, largest first
+def totals_by(rollup, column):
+    return rollup.groupby(column, observed=True)['emission_kg'].sum().sort_values(ascending=False)
+
+
+# Days x modes table of emissions, zero where a mode had no trips
+def daily_by_mode(rollup):
+    return rollup.pivot_table(index='date', columns='transport_mode', values='emission_kg',
+                              aggfunc='sum', fill_value=0, observed=True)
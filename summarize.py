@@ -1,22 +1,242 @@
-# summarize.py
-import openai
+# summarize.py (Report summaries: cached LLM text with a template fallback)
+#
+# The LLM backend is optional. Without OPENAI_API_KEY (or the openai package)
+# every summary comes from the template, as the report always did.
 
-openai.api_key = 'YOUR_API_KEY'  # Replace with environment variable for security
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from rollup import daily_totals
+from time_series import detect_anomalies
 
-def generate_summary(df_anomalies):
-    recent = df_anomalies[-7:]  # Last 7 days
-    total_emission = recent['emission_kg'].sum()
-    anomalies = recent[recent['anomaly'] == -1]
+SUMMARY_CACHE = 'data/summaries.json'
+OFFSET_COST_PER_KG = 0.01  # $0.01 per kg CO2
+PROMPT_VERSION = 1  # bump when the prompt changes so cached summaries are regenerated
 
-    prompt = (
-        f"In the past week, total carbon emissions were {total_emission:.2f} kg. "
-        f"There were {len(anomalies)} anomalies. Summarize these results for a report."
+
+# The statistics a summary is written from; two frames with the same stats get
+# the same summary. Totals come from an EmissionIndex when one is given.
+def summary_stats(df_anomalies, days=7, index=None):
+    recent = df_anomalies[-days:]
+    anomalies = df_anomalies[df_anomalies['anomaly'] == -1]
+    recent_anomalies = recent[recent['anomaly'] == -1]
+    week_total = index.recent_total(days) if index is not None else recent['emission_kg'].sum()
+    total = index.total() if index is not None else df_anomalies['emission_kg'].sum()
+    return {
+        'week_total': round(float(week_total), 2),
+        'total': round(float(total), 2),
+        'anomaly_count': len(anomalies),
+        'week_anomaly_count': len(recent_anomalies),
+        'week_anomaly_dates': [day.strftime('%Y-%m-%d') for day in recent_anomalies.index]
+    }
+
+
+def template_summary(stats):
+    total_offset_cost = stats['total'] * OFFSET_COST_PER_KG
+    return (
+        f"Summary Report:\n"
+        f"In the last 7 days, total emissions were {stats['week_total']:.2f} kg CO2.\n"
+        f"Total emissions over 30 days: {stats['total']:.2f} kg CO2.\n"
+        f"{stats['anomaly_count']} anomaly days were detected.\n"
+        f"Estimated Carbon Offset Cost: ${total_offset_cost:.2f} (at ${OFFSET_COST_PER_KG:.2f} per kg CO2)\n"
+        f"Suggested Action: Investigate the anomaly days for unusual travel patterns or data errors. "
+        f"Consider strategies to reduce emissions on high-output days."
     )
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}]
+
+def summary_prompt(stats, label=None):
+    subject = f" for {label}" if label else ""
+    dates = f" (on {', '.join(stats['week_anomaly_dates'])})" if stats['week_anomaly_dates'] else ""
+    return (
+        f"In the past week, total carbon emissions{subject} were {stats['week_total']:.2f} kg. "
+        f"There were {stats['week_anomaly_count']} anomalies{dates}. Summarize these results for a report."
     )
 
-    summary = response['choices'][0]['message']['content']
-    return summary
+
+class OpenAIBackend:
+    def __init__(self, model='gpt-3.5-turbo', api_key=None):
+        import openai
+        self.openai = openai
+        self.openai.api_key = api_key or os.environ['OPENAI_API_KEY']
+        self.model = model
+        self.name = f'openai:{model}'
+
+    def complete(self, prompt, timeout=None):
+        response = self.openai.ChatCompletion.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            request_timeout=timeout
+        )
+        return response['choices'][0]['message']['content']
+
+
+# Local stand-in for the LLM: echoes the prompt after an optional delay, or
+# raises when fail is set; calls counts the requests that reached it
+class StubBackend:
+    name = 'stub'
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt, timeout=None):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            threading.Event().wait(self.delay)
+        if self.fail:
+            raise RuntimeError('stub backend failure')
+        return f"[stub] {prompt}"
+
+
+# Backend by name ('auto', 'openai', 'stub' or 'none'); 'auto' picks OpenAI when
+# OPENAI_API_KEY is set and the package is installed, else None (template only)
+def default_backend(name=None):
+    name = name or os.environ.get('SUMMARY_BACKEND', 'auto')
+    if name == 'none':
+        return None
+    if name == 'stub':
+        return StubBackend()
+    if name in ('auto', 'openai') and os.environ.get('OPENAI_API_KEY'):
+        try:
+            return OpenAIBackend()
+        except ImportError:
+            if name == 'openai':
+                raise
+    return None
+
+
+# Summaries keyed by a hash of their input statistics and persisted to disk;
+# backend calls run on a bounded pool and fall back to the template when the
+# backend is absent, fails or takes longer than timeout seconds
+class SummaryService:
+    def __init__(self, backend=None, cache_path=SUMMARY_CACHE, timeout=10, max_workers=4):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._cache = self._load()
+        self.hits = 0
+        self.generated = 0
+        self.fallbacks = 0
+
+    def _load(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path) as f:
+                return json.load(f)
+        return {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._cache, f, indent=4)
+        os.replace(tmp_path, self.cache_path)
+
+    def key(self, stats, label=None):
+        payload = json.dumps({'stats': stats, 'label': label, 'backend': self.backend.name,
+                              'prompt': PROMPT_VERSION}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cached(self, key):
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self.hits += 1
+            return text
+
+    def _fallback(self, stats):
+        with self._lock:
+            self.fallbacks += 1
+        return template_summary(stats)
+
+    def _store(self, key, text):
+        with self._lock:
+            self._cache[key] = text
+            self.generated += 1
+            self._save()
+
+    def _finish(self, key, stats, future):
+        if not future.done():
+            # A late answer is still cached for the next run
+            if not future.cancel():
+                future.add_done_callback(lambda done: done.exception() or self._store(key, done.result()))
+            print(f"Summary backend timed out after {self.timeout}s; using the template")
+            return self._fallback(stats)
+        try:
+            text = future.result()
+        except Exception as exc:
+            print(f"Summary backend failed ({exc}); using the template")
+            return self._fallback(stats)
+        self._store(key, text)
+        return text
+
+    def summarize(self, stats, label=None):
+        return self.summarize_many({label: stats})[label]
+
+    # Runs on a worker; `started` records when the request actually began
+    def _complete(self, prompt, started):
+        started.append(time.monotonic())
+        return self.backend.complete(prompt, self.timeout)
+
+    # {label: stats} -> {label: summary}; uncached summaries are requested concurrently
+    def summarize_many(self, stats_by_label):
+        if self.backend is None:
+            return {label: self._fallback(stats) for label, stats in stats_by_label.items()}
+
+        results, pending = {}, {}
+        for label, stats in stats_by_label.items():
+            key = self.key(stats, label)
+            text = self._cached(key)
+            if text is not None:
+                results[label] = text
+            else:
+                started = []
+                future = self.executor.submit(self._complete, summary_prompt(stats, label), started)
+                pending[label] = key, stats, started, future
+
+        # Each request gets timeout seconds from the moment a worker starts it;
+        # requests still queued behind others wait for a worker, they are never
+        # cancelled. Without a known start yet, check again after timeout seconds.
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[0] + self.timeout for _, _, started, future in pending.values()
+                         if started and not future.done()]
+            wait([future for _, _, _, future in pending.values()], return_when=FIRST_COMPLETED,
+                 timeout=max(0.0, min(deadlines) - now) if deadlines else self.timeout)
+            now = time.monotonic()
+            for label, (key, stats, started, future) in list(pending.items()):
+                if future.done() or (started and now - started[0] >= self.timeout):
+                    results[label] = self._finish(key, stats, future)
+                    del pending[label]
+        return {label: results[label] for label in stats_by_label}
+
+    def stats(self):
+        return {'hits': self.hits, 'generated': self.generated, 'fallbacks': self.fallbacks}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Summary statistics for each user or transport mode of a rollup
+def group_stats(rollup, column, engine='isolation_forest'):
+    stats = {}
+    for value in sorted(rollup[column].unique()):
+        daily = daily_totals(rollup[rollup[column] == value])
+        stats[f"{column} {value}"] = summary_stats(detect_anomalies(daily, engine=engine))
+    return stats
+
+
+def generate_summary(df_anomalies, service=None):
+    service = service or SummaryService(default_backend())
+    return service.summarize(summary_stats(df_anomalies))
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import distance_index  # noqa: E402
+
+
+# Keep test routes out of the shared data/distance_index.sqlite
+@pytest.fixture(autouse=True)
+def memory_distance_index(monkeypatch):
+    index = distance_index.DistanceIndex(':memory:')
+    monkeypatch.setattr(distance_index, '_default_index', index)
+    return index
+
+
+# Builds trip store entries: make_trip(day, user_id=..., mode=..., latitude=...)
+# is a noon trip on that day of 2025 (March unless month is given) from
+# Brandenburg Gate to a stop at that latitude
+@pytest.fixture
+def make_trip():
+    def make(day, user_id='user_1', mode='bus', latitude=52.505957, month=3):
+        start = {'type': 'location', 'id': None, 'latitude': 52.51651, 'longitude': 13.381936}
+        end = {'type': 'location', 'id': None, 'latitude': latitude, 'longitude': 13.438388}
+        return {'user_id': user_id, 'dateTime': f'2025-{month:02d}-{day:02d}T12:00:00Z', 'transportMode': mode,
+                'fromStops': [{'location': start}], 'toStops': [{'location': end}]}
+    return make
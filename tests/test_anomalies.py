@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from time_series import EWMADetector, detect_anomalies
+
+
+def daily(values, start='2025-01-01'):
+    index = pd.date_range(start, periods=len(values), freq='D', tz='UTC', name='datetime')
+    return pd.DataFrame({'emission_kg': np.asarray(values, dtype='float64')}, index=index)
+
+
+def series(n, seed=0):
+    values = 5 + np.random.default_rng(seed).normal(0, 0.5, n)
+    values[20::25] += 6
+    return values
+
+
+def test_flat_series_does_not_flag_rounding_noise():
+    assert EWMADetector().fit_predict(daily([5.0] * 10 + [5.0001]))[-1] == 1
+    assert EWMADetector().fit_predict(daily([5.0] * 10 + [8.0]))[-1] == -1
+
+
+class CountingDetector(EWMADetector):
+    updates = 0
+
+    def update(self, value):
+        CountingDetector.updates += 1
+        return super().update(value)
+
+
+def test_named_detector_folds_in_only_new_days(tmp_path):
+    values = series(90)
+    expected = EWMADetector().fit_predict(daily(values))
+    assert (expected == -1).sum() >= 3
+
+    CountingDetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(values[:60]))
+    CountingDetector.updates = 0
+    labels = CountingDetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(values))
+    assert CountingDetector.updates == 31  # days 60..89, plus day 59 that was still open
+    assert labels.tolist() == expected.tolist()
+
+    CountingDetector.updates = 0
+    again = CountingDetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(values))
+    assert CountingDetector.updates == 1 and again.tolist() == expected.tolist()
+
+
+def test_named_detector_replays_a_rewritten_history(tmp_path):
+    values = series(40)
+    EWMADetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(values))
+    changed = values.copy()
+    changed[30] += 1
+    labels = EWMADetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(changed))
+    assert labels.tolist() == EWMADetector().fit_predict(daily(changed)).tolist()
+    shifted = EWMADetector(name='t', state_dir=str(tmp_path)).fit_predict(daily(values, start='2024-12-31'))
+    assert shifted.tolist() == EWMADetector().fit_predict(daily(values)).tolist()
+
+
+def test_detect_anomalies_uses_the_named_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df = daily(series(50))
+    first = detect_anomalies(df, engine='ewma', name='report')
+    assert (tmp_path / 'data' / 'models' / 'ewma_report.json').exists()
+    assert detect_anomalies(df, engine='ewma', name='report')['anomaly'].tolist() == first['anomaly'].tolist()
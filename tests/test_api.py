@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import api
+from trip_store import TripStore
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch, make_trip):
+    monkeypatch.chdir(tmp_path)  # caches, rollups and models land under tmp_path/data
+    path = 'data/trips.jsonl'
+    with TripStore(path) as store:
+        for i in range(40):
+            month, day = (2, 1 + i) if i < 28 else (3, i - 27)
+            store.append(make_trip(day, user_id=f'user_{i % 3}', mode=['bus', 'tram'][i % 2],
+                                   latitude=52.5 + i / 1000, month=month))
+    return path
+
+
+def run(app, scenario):
+    async def main():
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_unchanged_result_answers_304(source):
+    async def scenario(client):
+        first = await client.get('/totals?modes=bus')
+        body = await first.json()
+        again = await client.get('/totals?modes=bus', headers={'If-None-Match': first.headers['ETag']})
+        return first.status, body, again.status, again.headers['ETag'] == first.headers['ETag']
+
+    status, body, again, same_etag = run(api.create_app(source), scenario)
+    assert status == 200 and body['data']['days'] == 39 and body['data']['modes'] == ['bus']
+    assert again == 304 and same_etag
+
+
+def test_bad_date_is_a_400(source):
+    async def scenario(client):
+        response = await client.get('/totals?start=bogus')
+        return response.status, await client.get('/breakdown/nothing')
+
+    status, unknown = run(api.create_app(source), scenario)
+    assert status == 400 and unknown.status == 404
+
+
+def test_identical_concurrent_requests_are_computed_once(source, monkeypatch):
+    calls = []
+
+    def slow_totals(data, query):
+        calls.append(query)
+        time.sleep(0.3)
+        return {'total_kg': data.index.total()}
+
+    monkeypatch.setattr(api, 'totals', slow_totals)
+    app = api.create_app(source)
+
+    async def scenario(client):
+        await client.get('/health')  # load the data first so only the totals overlap
+        responses = await asyncio.gather(*[client.get('/totals') for _ in range(6)])
+        return [response.status for response in responses], app[api.SERVICE].stats()
+
+    statuses, stats = run(app, scenario)
+    assert statuses == [200] * 6
+    assert len(calls) == 1 and stats['misses'] == 1 and stats['coalesced'] == 5
+
+
+def test_concurrent_forecasts_share_the_model_safely(source):
+    async def scenario(client):
+        responses = await asyncio.gather(*[client.get(f'/forecast?days=2&start=2025-02-0{n}') for n in range(1, 7)])
+        return [(response.status, len((await response.json())['data'])) for response in responses]
+
+    assert run(api.create_app(source), scenario) == [(200, 2)] * 6
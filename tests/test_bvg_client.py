@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from bvg_client import BVGClient
+from bvg_stub import StubBVG
+
+
+@pytest.fixture
+def stub():
+    with StubBVG() as server:
+        yield server
+
+
+def client_for(stub, **kwargs):
+    kwargs = dict({'requests_per_second': None, 'backoff': 0.05, 'max_retries': 3}, **kwargs)
+    return BVGClient(stub.url, **kwargs)
+
+
+def test_retries_a_429_with_backoff(stub):
+    stub.fail(429, 503)
+    with client_for(stub) as client:
+        stops = client.locations('Brandenburg Gate')
+    assert stops[0]['id'] == '900100025'
+    times = [when for when, _, _ in stub.requests]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.05 and times[2] - times[1] >= 0.1  # backoff doubles
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.fail(429, 429, 429)
+    with client_for(stub, max_retries=2) as client:
+        assert client.locations('Brandenburg Gate') is None
+    assert stub.count() == 3
+
+
+def test_rate_limiter_spaces_requests(stub):
+    with client_for(stub, requests_per_second=20) as client:
+        started = time.monotonic()
+        client.map(lambda i: client.locations(f"stop {i}"), range(5))
+        elapsed = time.monotonic() - started
+    assert stub.count() == 5
+    assert elapsed >= 0.2  # the fifth request may start no sooner than 4 x 50 ms after the first
+
+
+def test_cached_responses_expire_after_ttl(stub):
+    with client_for(stub, cache_ttl=0.2) as client:
+        first = client.locations('East Side Gallery')
+        assert client.locations('East Side Gallery') == first
+        assert stub.count() == 1
+        time.sleep(0.3)
+        assert client.locations('East Side Gallery') == first
+    assert stub.count() == 2
+    assert (client.cache.hits, client.cache.misses) == (1, 2)
+
+
+def test_concurrent_identical_requests_are_coalesced(stub):
+    stub.latency = 0.3
+    results = []
+    with client_for(stub, max_workers=8) as client:
+        threads = [threading.Thread(target=lambda: results.append(
+            client.journeys('900100025', '900120544', '2025-03-01T11:00:00Z', results=2))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert stub.count('/journeys') == 1
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert len(results[0]['journeys']) == 2
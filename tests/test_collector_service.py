@@ -0,0 +1,85 @@
+import pytest
+
+import collector_service
+from collector_service import journey_entry, trip_key
+from distance_index import DistanceIndex
+
+
+@pytest.fixture(autouse=True)
+def memory_index(monkeypatch):
+    index = DistanceIndex(':memory:')
+    monkeypatch.setattr(collector_service, 'default_index', lambda: index)
+    return index
+
+
+def stop(stop_id, latitude, longitude):
+    return {'type': 'stop', 'id': stop_id, 'name': stop_id,
+            'location': {'type': 'location', 'id': stop_id, 'latitude': latitude, 'longitude': longitude}}
+
+
+def journey(departure, planned='2025-03-01T12:00:00+01:00'):
+    return {'legs': [{
+        'origin': stop('900100025', 52.51651, 13.381936),
+        'destination': stop('900120544', 52.505957, 13.438388),
+        'departure': departure,
+        'plannedDeparture': planned,
+        'line': {'product': 'bus'}
+    }]}
+
+
+def test_delayed_journey_keeps_its_key():
+    on_time = journey_entry(journey('2025-03-01T12:00:00+01:00'), 'user_1', 'a', 'b')
+    delayed = journey_entry(journey('2025-03-01T12:04:00+01:00'), 'user_1', 'a', 'b')
+    assert on_time['dateTime'] == delayed['dateTime'] == '2025-03-01T11:00:00Z'
+    assert trip_key(on_time) == trip_key(delayed)
+
+
+def test_entry_keeps_the_stop_id_in_the_location(memory_index):
+    entry = journey_entry(journey('2025-03-01T12:00:00+01:00'), 'user_1', 'a', 'b')
+    assert entry['fromStops'] == [{'location': {'type': 'location', 'id': '900100025',
+                                                'latitude': 52.51651, 'longitude': 13.381936}}]
+    assert entry['toStops'][0]['location']['id'] == '900120544'
+    assert trip_key(entry)[2:] == (('900100025',), ('900120544',))
+    assert list(memory_index._memory) == ['geodesic|id:900100025|id:900120544']
+
+
+class FlakyClient:
+    def __init__(self):
+        self.calls = 0
+
+    def locations(self, address):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError('network down')
+        return [stop('900100025', 52.51651, 13.381936)]
+
+    def close(self):
+        pass
+
+
+def test_failed_stop_lookup_is_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no legacy data/data.json to migrate
+    client = FlakyClient()
+    service = collector_service.CollectorService([], filename=str(tmp_path / 'trips.jsonl'),
+                                                 refresh=False, metrics_file=None, client=client)
+    assert service._stop('Brandenburg Gate') is None
+    assert service._stop('Brandenburg Gate')['id'] == '900100025'
+    assert service._stop('Brandenburg Gate')['id'] == '900100025'
+    assert client.calls == 2
+
+
+def test_collects_through_the_stub_api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from bvg_client import BVGClient
+    from bvg_stub import StubBVG
+    from trip_store import iter_trips
+
+    store = str(tmp_path / 'trips.jsonl')
+    with StubBVG(delay=120) as stub:
+        service = collector_service.CollectorService(
+            [('user_1', 'Brandenburg Gate', 'East Side Gallery')], filename=store, results=3,
+            refresh=False, metrics_file=None, client=BVGClient(stub.url, requests_per_second=None))
+        metrics = service.run(once=True)
+    trips = list(iter_trips(store))
+    assert metrics['trips_written'] == len(trips) == 3
+    assert trips[0]['fromStops'][0]['location']['id'] == '900100025'
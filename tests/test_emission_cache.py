@@ -0,0 +1,44 @@
+import emission_cache
+from emission_cache import cache_state, load_emission_data_cached
+from trip_store import TripStore
+
+
+def test_append_during_load_is_picked_up_next_time(tmp_path, monkeypatch, make_trip):
+    source, cache_dir = str(tmp_path / 'trips.jsonl'), str(tmp_path / 'cache')
+    with TripStore(source) as store:
+        store.append(make_trip(1))
+    assert len(load_emission_data_cached(source, cache_dir=cache_dir)) == 1
+
+    read_since = emission_cache.read_since
+
+    # The collector appends right after the cache has read the new lines
+    def read_then_append(path, offset):
+        result = read_since(path, offset)
+        with TripStore(source) as store:
+            store.append(make_trip(3))
+        return result
+
+    with TripStore(source) as store:
+        store.append(make_trip(2))
+    monkeypatch.setattr(emission_cache, 'read_since', read_then_append)
+    assert len(load_emission_data_cached(source, cache_dir=cache_dir)) == 2
+    monkeypatch.setattr(emission_cache, 'read_since', read_since)
+
+    df = load_emission_data_cached(source, cache_dir=cache_dir)
+    assert df.index.day.tolist() == [1, 2, 3]
+    assert cache_state(source, cache_dir)['rows'] == 3
+
+
+def test_compact_load_reports_the_default_layout_size(tmp_path, make_trip, capsys):
+    from time_series import default_memory_mb, frame_memory_mb, report_compact_memory
+    source, cache_dir = str(tmp_path / 'trips.jsonl'), str(tmp_path / 'cache')
+    with TripStore(source) as store:
+        for i in range(12):
+            store.append(make_trip(1 + i, user_id=f'user_{i % 3}', mode=['bus', 'tram'][i % 2]))
+    full = load_emission_data_cached(source, cache_dir=cache_dir)
+    compact = load_emission_data_cached(source, cache_dir=cache_dir, compact=True)
+    assert default_memory_mb(compact) == frame_memory_mb(full)
+
+    report_compact_memory(compact)
+    before, after = frame_memory_mb(full), frame_memory_mb(compact)
+    assert capsys.readouterr().out == f"Emission frame memory: {before:.2f} MB -> {after:.2f} MB (compact)\n"
@@ -0,0 +1,71 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from emission_index import EmissionIndex
+from rollup import build_rollup, daily_totals, filter_rollup, totals_by
+
+def day(value):
+    return pd.Timestamp(value, tz='UTC')
+
+
+QUERIES = [
+    (None, None, None),
+    (day('2025-01-10'), day('2025-02-20'), None),
+    (None, day('2025-01-31'), ['bus']),
+    (day('2025-02-01'), None, ['tram', 'suburban']),
+    (day('2025-01-05'), day('2025-01-05'), None),
+    (day('2025-03-01'), day('2025-03-31'), ['bus', 'ferry']),
+    (day('2025-02-03'), day('2025-02-09'), ['ferry']),
+    (day('2026-01-01'), None, None),
+]
+
+
+@pytest.fixture(scope='module')
+def rollup():
+    rng = np.random.default_rng(7)
+    n = 3000
+    seconds = rng.integers(0, 70 * 86_400, n)
+    index = pd.to_datetime(pd.Timestamp('2025-01-01', tz='UTC').value // 10**9 + seconds, unit='s', utc=True)
+    df = pd.DataFrame({
+        'emission_kg': rng.integers(1, 40, n) / 10,  # coarse values, so days tie
+        'transport_mode': rng.choice(['bus', 'tram', 'suburban', 'ferry'], n, p=[0.5, 0.3, 0.19, 0.01]),
+        'user_id': rng.choice(['user_1', 'user_2', 'user_3'], n),
+    }, index=index.rename('datetime')).sort_index()
+    return build_rollup(df)
+
+
+@pytest.fixture(scope='module')
+def index(rollup):
+    return EmissionIndex(rollup)
+
+
+def expected_top(daily, k):
+    values = daily['emission_kg'].to_numpy()
+    best = heapq.nlargest(k, range(len(values)), key=values.__getitem__)
+    return daily.iloc[best].reset_index()
+
+
+@pytest.mark.parametrize('start, end, modes', QUERIES)
+def test_index_matches_the_filtered_rollup(rollup, index, start, end, modes):
+    filtered = filter_rollup(rollup, start, end, modes)
+    daily = daily_totals(filtered)
+
+    assert index.total(start, end, modes) == pytest.approx(filtered['emission_kg'].sum())
+    pd.testing.assert_series_equal(index.totals_by_mode(start, end, modes), totals_by(filtered, 'transport_mode'),
+                                   check_names=False, check_index_type=False, rtol=1e-9)
+    got = index.daily(start, end, modes)
+    assert got.index.tolist() == daily.index.tolist()
+    assert got['emission_kg'].to_numpy() == pytest.approx(daily['emission_kg'].to_numpy())
+    assert index.recent_total(7, start, end, modes) == pytest.approx(daily['emission_kg'].tail(7).sum())
+
+
+@pytest.mark.parametrize('start, end, modes', QUERIES)
+@pytest.mark.parametrize('k', [1, 5, 40])
+def test_top_days_match_ranking_the_daily_series(index, start, end, modes, k):
+    expected = expected_top(index.daily(start, end, modes), k)
+    got = index.top_days(k, start, end, modes)
+    assert got['datetime'].tolist() == expected['datetime'].tolist()
+    assert got['emission_kg'].tolist() == expected['emission_kg'].tolist()
@@ -0,0 +1,34 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from forecaster import PersistentForecaster
+
+
+def daily(days, seed=0):
+    index = pd.date_range('2025-01-01', periods=days, freq='D', tz='UTC', name='datetime')
+    values = 5 + np.random.default_rng(seed).normal(0, 0.5, days)
+    return pd.DataFrame({'emission_kg': values}, index=index)
+
+
+def test_unchanged_history_reuses_the_saved_model(tmp_path):
+    PersistentForecaster('t', model_dir=str(tmp_path)).fit(daily(30))
+    forecaster = PersistentForecaster('t', model_dir=str(tmp_path))
+    forecaster.fit(daily(30))
+    assert forecaster.metrics['mode'] == 'reused'
+    saved = json.loads((tmp_path / 't.json').read_text())
+    assert saved['meta']['history_days'] == 30 and 'model' in saved
+
+
+def test_concurrent_fits_of_one_name_do_not_collide(tmp_path):
+    def forecast(days):
+        _, result = PersistentForecaster('shared', model_dir=str(tmp_path)).forecast(daily(days, seed=days), days=2)
+        return len(result)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        assert list(pool.map(forecast, range(20, 26))) == [days + 2 for days in range(20, 26)]
+    assert [p.name for p in tmp_path.iterdir()] == ['shared.json']
+    _, meta = PersistentForecaster('shared', model_dir=str(tmp_path))._load()
+    assert meta['history_days'] in range(20, 26)
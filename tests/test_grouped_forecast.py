@@ -0,0 +1,28 @@
+import time
+import pandas as pd
+import time_series
+
+
+def _fake_forecast(df_group, days):
+    if df_group['emission_kg'].iloc[0] > 100:
+        time.sleep(30)  # a fit that hangs
+    return pd.DataFrame({'ds': [pd.Timestamp('2025-01-01')], 'yhat': [1.0], 'yhat_lower': [0.5], 'yhat_upper': [1.5]})
+
+
+def _frame():
+    index = pd.date_range('2025-01-01', periods=3, freq='D', tz='UTC', name='datetime')
+    return pd.DataFrame({
+        'emission_kg': [500.0, 1.0, 2.0],
+        'user_id': ['slow', 'b', 'c']
+    }, index=index)
+
+
+def test_timeout_counts_from_series_start_and_kills_the_worker(monkeypatch):
+    monkeypatch.setattr(time_series, '_forecast_group', _fake_forecast)
+    start = time.monotonic()
+    result = time_series.forecast_emissions_by_group(_frame(), 'user_id', max_workers=1, timeout=1)
+    elapsed = time.monotonic() - start
+
+    # 'slow' runs first and is killed after 1 s; 'b' and 'c' still get their turn
+    assert sorted(result['user_id']) == ['b', 'c']
+    assert elapsed < 10
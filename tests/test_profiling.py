@@ -0,0 +1,44 @@
+import tracemalloc
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def clean_profile(monkeypatch):
+    monkeypatch.setattr(profiling, '_enabled', False)
+    monkeypatch.setattr(profiling, '_memory', False)
+    profiling.reset()
+    yield
+    profiling.reset()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_timing_does_not_trace_memory():
+    profiling.enable()
+    with profiling.stage('load'):
+        pass
+    profiling.record('render.chart', 0.5)
+    assert not tracemalloc.is_tracing()
+    stages = profiling.summary()
+    assert [(s['stage'], s['calls'], s['peak_mb']) for s in stages] == [('load', 1, None), ('render.chart', 1, None)]
+    assert '| render.chart | 1 | 0.500 | - |' in profiling.markdown_section(stages)
+
+
+def test_memory_is_a_separate_opt_in():
+    profiling.enable(memory=True)
+    with profiling.stage('outer'):
+        with profiling.stage('inner'):
+            block = bytearray(4 * 2 ** 20)
+        del block
+    peaks = {s['stage']: s['peak_mb'] for s in profiling.summary()}
+    assert peaks['inner'] >= 3.9 and peaks['outer'] >= peaks['inner']
+
+
+def test_disabled_records_nothing():
+    with profiling.stage('load'):
+        pass
+    profiling.record('render.chart', 0.5)
+    assert profiling.summary() == []
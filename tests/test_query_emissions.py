@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+import partitions
+from emission_cache import load_emission_data_cached, read_cached_rows
+from partitions import update_partitions
+from time_series import query_emissions
+from trip_store import TripStore
+
+
+def test_no_modes_selects_no_trips(tmp_path, make_trip):
+    source = str(tmp_path / 'trips.jsonl')
+    with TripStore(source) as store:
+        for day in range(1, 5):
+            store.append(make_trip(day, mode='bus' if day % 2 else 'tram'))
+    partition_dir = update_partitions(source, partition_root=str(tmp_path / 'partitions'),
+                                      cache_dir=str(tmp_path / 'cache'))
+
+    assert len(query_emissions(partition_dir, modes=['bus'])) == 2
+    df = query_emissions(partition_dir, '2025-03-01', '2025-03-31', modes=[])
+    assert df.empty and list(df.columns) == ['emission_kg', 'transport_mode', 'user_id']
+    assert query_emissions(partition_dir, modes=[], compact=True).empty
+
+
+def test_partitions_fold_in_only_new_rows(tmp_path, monkeypatch, make_trip):
+    source, cache_dir = str(tmp_path / 'trips.jsonl'), str(tmp_path / 'cache')
+    kwargs = {'partition_root': str(tmp_path / 'partitions'), 'cache_dir': cache_dir}
+    with TripStore(source) as store:
+        for day in range(1, 11):
+            store.append(make_trip(day, month=2 if day <= 5 else 3))
+    partition_dir = update_partitions(source, **kwargs)
+    february = os.path.join(partition_dir, '2025-02.parquet')
+    written = os.stat(february).st_mtime_ns
+
+    reads = []
+    monkeypatch.setattr(partitions, 'read_cached_rows',
+                        lambda source, start=0, cache_dir=None: reads.append(start) or read_cached_rows(source, start, cache_dir))
+    with TripStore(source) as store:
+        store.append(make_trip(20, month=3))
+        store.append(make_trip(2, month=4))
+    update_partitions(source, **kwargs)
+    assert update_partitions(source, **kwargs) == partition_dir
+    assert reads == [10]
+    assert os.stat(february).st_mtime_ns == written
+    assert sorted(os.listdir(partition_dir)) == ['2025-02.parquet', '2025-03.parquet', '2025-04.parquet']
+
+    expected = load_emission_data_cached(source, cache_dir=cache_dir).sort_index()
+    pd.testing.assert_frame_equal(query_emissions(partition_dir).sort_index(), expected)
@@ -0,0 +1,83 @@
+import multiprocessing
+
+import pandas as pd
+
+import emission_cache
+import rollup as rollup_module
+from emission_cache import load_emission_data_cached
+from rollup import build_rollup, build_rollup_chunked, daily_totals, load_rollup, totals_by
+from trip_store import TripStore
+
+
+def test_rollup_totals_match_the_float64_frame(tmp_path, make_trip):
+    source = str(tmp_path / 'trips.jsonl')
+    kwargs = {'rollup_dir': str(tmp_path / 'rollups'), 'cache_dir': str(tmp_path / 'cache')}
+    with TripStore(source) as store:
+        for i in range(30):
+            store.append(make_trip(1 + i % 7, f'user_{i % 3}', ['bus', 'tram'][i % 2], 52.5 + i / 1000))
+    rollup = load_rollup(source, **kwargs)
+    assert rollup['emission_kg'].dtype == 'float64'
+
+    df = load_emission_data_cached(source, cache_dir=kwargs['cache_dir'])
+    expected = df.groupby('user_id')['emission_kg'].sum()
+    assert totals_by(rollup, 'user_id').sort_index().tolist() == expected.sort_index().tolist()
+
+
+def test_rollup_reads_only_rows_past_the_last_run(tmp_path, monkeypatch, make_trip):
+    source = str(tmp_path / 'trips.jsonl')
+    kwargs = {'rollup_dir': str(tmp_path / 'rollups'), 'cache_dir': str(tmp_path / 'cache')}
+    with TripStore(source) as store:
+        for i in range(20):
+            store.append(make_trip(1 + i % 5, 'user_1', 'bus', 52.5 + i / 1000))
+    load_rollup(source, **kwargs)
+
+    reads = []
+    read_cached_rows = rollup_module.read_cached_rows
+    monkeypatch.setattr(rollup_module, 'read_cached_rows',
+                        lambda source, start=0, cache_dir=None: reads.append(start) or read_cached_rows(source, start, cache_dir))
+    load_rollup(source, **kwargs)
+    assert reads == []
+
+    with TripStore(source) as store:
+        for i in range(4):
+            store.append(make_trip(9, 'user_2', 'tram', 52.6 + i / 1000))
+    rollup = load_rollup(source, **kwargs)
+    assert reads == [20]
+
+    expected = build_rollup(load_emission_data_cached(source, cache_dir=kwargs['cache_dir']))
+    pd.testing.assert_frame_equal(rollup.sort_values(['date', 'transport_mode', 'user_id']).reset_index(drop=True),
+                                  expected.sort_values(['date', 'transport_mode', 'user_id']).reset_index(drop=True))
+
+
+def test_chunked_rollup_matches_the_default_path(tmp_path, make_trip):
+    source = str(tmp_path / 'trips.jsonl')
+    with TripStore(source) as store:
+        for i in range(50):
+            store.append(make_trip(1 + i % 9, f'user_{i % 4}', ['bus', 'tram', 'subway'][i % 3], 52.5 + i / 997))
+    default = daily_totals(load_rollup(source, rollup_dir=str(tmp_path / 'rollups'), cache_dir=str(tmp_path / 'cache')))
+    chunked = daily_totals(build_rollup_chunked(source, chunk_size=7))
+    assert chunked['emission_kg'].dtype == 'float64'
+    pd.testing.assert_frame_equal(chunked, default, check_exact=False, rtol=1e-12, check_freq=False)
+
+
+def test_processes_updating_the_cache_together_lose_no_rows(tmp_path, monkeypatch, make_trip):
+    monkeypatch.setattr(emission_cache, 'MAX_PARTS', 3)  # compact often, while others read
+    source = str(tmp_path / 'trips.jsonl')
+    kwargs = {'rollup_dir': str(tmp_path / 'rollups'), 'cache_dir': str(tmp_path / 'cache')}
+
+    def collect(worker):
+        for i in range(8):
+            with TripStore(source) as store:
+                store.append(make_trip(1 + i, f'user_{worker}', 'bus', 52.5 + i / 1000))
+            load_rollup(source, **kwargs)
+
+    workers = [multiprocessing.get_context('fork').Process(target=collect, args=(n,)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * 4
+
+    assert load_rollup(source, **kwargs)['trips'].sum() == 32
+    df = load_emission_data_cached(source, cache_dir=kwargs['cache_dir'])
+    assert len(df) == 32 and df.groupby('user_id').size().tolist() == [8] * 4
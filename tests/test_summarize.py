@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from summarize import StubBackend, SummaryService, summary_prompt, template_summary
+
+
+def stats(week_total=5.61):
+    return {'week_total': week_total, 'total': 45.42, 'anomaly_count': 5,
+            'week_anomaly_count': 1, 'week_anomaly_dates': ['2025-03-19']}
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'summaries.json')
+
+
+def test_repeated_stats_are_served_from_the_cache(cache_path):
+    backend = StubBackend()
+    service = SummaryService(backend, cache_path=cache_path, timeout=5)
+    first = service.summarize(stats())
+    assert first == f"[stub] {summary_prompt(stats())}"
+    assert service.summarize(stats()) == first
+    assert backend.calls == 1
+    assert service.stats() == {'hits': 1, 'generated': 1, 'fallbacks': 0}
+    service.close()
+
+    # Persisted: a new service answers without calling the backend
+    reopened = SummaryService(backend, cache_path=cache_path, timeout=5)
+    assert reopened.summarize(stats()) == first and backend.calls == 1
+    reopened.close()
+
+
+def test_timeout_falls_back_to_the_template_and_caches_the_late_answer(cache_path):
+    backend = StubBackend(delay=0.5)
+    service = SummaryService(backend, cache_path=cache_path, timeout=0.1)
+    assert service.summarize(stats()) == template_summary(stats())
+    assert service.stats()['fallbacks'] == 1
+
+    deadline = time.monotonic() + 5
+    while service.stats()['generated'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert service.summarize(stats()) == f"[stub] {summary_prompt(stats())}"
+    assert backend.calls == 1
+    assert service.stats() == {'hits': 1, 'generated': 1, 'fallbacks': 1}
+    service.close()
+
+
+def test_backend_failure_falls_back_to_the_template(cache_path):
+    service = SummaryService(StubBackend(fail=True), cache_path=cache_path, timeout=5)
+    assert service.summarize(stats()) == template_summary(stats())
+    assert service.stats() == {'hits': 0, 'generated': 0, 'fallbacks': 1}
+    service.close()
+
+
+def test_summarize_many_requests_summaries_concurrently(cache_path):
+    backend = StubBackend(delay=0.3)
+    service = SummaryService(backend, cache_path=cache_path, timeout=5, max_workers=4)
+    batch = {f"user_{i}": stats(week_total=float(i)) for i in range(4)}
+    started = time.monotonic()
+    summaries = service.summarize_many(batch)
+    elapsed = time.monotonic() - started
+    assert backend.calls == 4
+    assert elapsed < 0.9  # one after another would take 1.2 s
+    assert summaries == {label: f"[stub] {summary_prompt(value, label)}" for label, value in batch.items()}
+    service.close()
+
+
+def test_queued_requests_are_timed_from_their_own_start(cache_path):
+    backend = StubBackend(delay=0.3)
+    service = SummaryService(backend, cache_path=cache_path, timeout=0.5, max_workers=2)
+    batch = {f"user_{i}": stats(week_total=float(i)) for i in range(8)}
+    summaries = service.summarize_many(batch)
+    assert list(summaries) == list(batch)
+    assert summaries == {label: f"[stub] {summary_prompt(value, label)}" for label, value in batch.items()}
+    assert backend.calls == 8 and service.stats()['fallbacks'] == 0
+    service.close()
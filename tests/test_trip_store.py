@@ -0,0 +1,32 @@
+from trip_store import TripStore, drop_torn_tail, iter_trips, read_since
+
+
+def test_append_after_torn_line_starts_a_new_line(tmp_path):
+    path = str(tmp_path / 'trips.jsonl')
+    with TripStore(path) as store:
+        store.append({'a': 1})
+    with open(path, 'a') as f:
+        f.write('{"a":2')  # crash mid-write
+
+    assert [entry['a'] for entry in iter_trips(path)] == [1]
+    with TripStore(path) as store:
+        store.append({'a': 3})
+
+    assert [entry['a'] for entry in iter_trips(path)] == [1, 3]
+    entries, offset = read_since(path, 0)
+    assert [entry['a'] for entry in entries] == [1, 3]
+    assert offset == len(open(path, 'rb').read())
+
+
+def test_drop_torn_tail(tmp_path):
+    path = str(tmp_path / 'trips.jsonl')
+    with open(path, 'w') as f:
+        f.write('{"a":1}\n{"a":')
+    assert drop_torn_tail(path, chunk_bytes=2) == 5
+    assert open(path).read() == '{"a":1}\n'
+    assert drop_torn_tail(path) == 0
+
+    with open(path, 'w') as f:
+        f.write('{"a":')
+    assert drop_torn_tail(path) == 5
+    assert open(path).read() == ''
@@ -1,49 +1,192 @@
 # time_series.py
 
 import json
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from emission import calculate_distance_km, estimate_emission
-from prophet import Prophet
-from sklearn.ensemble import IsolationForest
+from emission import estimate_emission_batch
+from distance_index import default_index
+from trip_store import iter_json_array, iter_trips
+from profiling import profiled
 
-# Load data from JSON and calculate emissions, including user_id
-def load_emission_data(json_file):
-    with open(json_file) as f:
-        data = json.load(f)
+# prophet and scikit-learn are imported inside the functions that use them;
+# together they take seconds to import and most callers never need them
+
+# Stream trip entries from a JSONL store or a legacy JSON array
+def iter_entries(json_file):
+    if json_file.endswith('.jsonl'):
+        return iter_trips(json_file)
+    return iter_json_array(json_file)
 
-    records = []
+# Build the emission frame column-wise from an iterable of trip entries.
+# compact=True stores mode and user as categoricals (collected as integer codes,
+# so no per-row strings are kept) and emissions as float32, unless
+# emission_dtype says otherwise (aggregations keep float64 sums). Distances are
+# computed once per route and looked up in distance_index (the shared on-disk
+# index by default) before being computed.
+@profiled()
+def build_emission_frame(entries, distance_method='geodesic', compact=False, distance_index=None, emission_dtype=None):
+    times = []
+    modes, users = (array('i'), array('i')) if compact else ([], [])
+    mode_codes, user_codes = {}, {}
+    routes, route_codes, route_locs = array('i'), {}, []
 
-    for entry in data:
-        trip_time = datetime.fromisoformat(entry['dateTime'].replace("Z", "+00:00"))
+    for entry in entries:
         from_loc = entry['fromStops'][0]['location']
         to_loc = entry['toStops'][0]['location']
+        mode = entry.get('transportMode', 'train')
+        user = entry.get('user_id', 'unknown')
+        times.append(entry['dateTime'])
+        if compact:
+            modes.append(mode_codes.setdefault(mode, len(mode_codes)))
+            users.append(user_codes.setdefault(user, len(user_codes)))
+        else:
+            modes.append(mode)
+            users.append(user)
+        from_id, to_id = from_loc.get('id'), to_loc.get('id')
+        if from_id and to_id:
+            key = (from_id, to_id)
+        else:
+            key = (from_loc['latitude'], from_loc['longitude'], to_loc['latitude'], to_loc['longitude'])
+        code = route_codes.get(key)
+        if code is None:
+            code = route_codes[key] = len(route_locs)
+            route_locs.append((from_loc, to_loc))
+        routes.append(code)
+
+    if compact:
+        modes = pd.Categorical.from_codes(np.frombuffer(modes, dtype=np.int32), categories=list(mode_codes))
+        users = pd.Categorical.from_codes(np.frombuffer(users, dtype=np.int32), categories=list(user_codes))
 
-        distance = calculate_distance_km(
-            from_loc['latitude'], from_loc['longitude'],
-            to_loc['latitude'], to_loc['longitude']
-        )
+    routes = np.frombuffer(routes, dtype=np.int32)
+    dist_index = distance_index or default_index()
+    route_distance = dist_index.distances([a for a, _ in route_locs], [b for _, b in route_locs], method=distance_method,
+                                          counts=np.bincount(routes, minlength=len(route_locs)).tolist())
+    distance = route_distance[routes]
+    emission = estimate_emission_batch(distance, modes)
+    index = pd.DatetimeIndex(pd.to_datetime(times, utc=True, format='ISO8601'), name='datetime').as_unit('ns')
+    return pd.DataFrame({
+        'emission_kg': emission.astype(emission_dtype or (np.float32 if compact else np.float64)),
+        'transport_mode': modes,
+        'user_id': users
+    }, index=index)
 
-        transport_mode = entry.get('transportMode', 'train')
-        user_id = entry.get('user_id', 'unknown')
-        emission = estimate_emission(distance, mode=transport_mode)
+# Load data from JSON and calculate emissions, including user_id
+@profiled()
+def load_emission_data(json_file, distance_method='geodesic', compact=False, distance_index=None):
+    return build_emission_frame(iter_entries(json_file), distance_method=distance_method, compact=compact,
+                                distance_index=distance_index)
 
-        records.append({
-            'datetime': trip_time,
-            'emission_kg': emission,
-            'transport_mode': transport_mode,
-            'user_id': user_id
-        })
+# Deep memory footprint of a frame, index included
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True, index=True).sum() / 2 ** 20
 
-    df = pd.DataFrame(records)
-    df.set_index('datetime', inplace=True)
-    return df
+# Deep memory the frame would take in the default layout (float64 emissions,
+# object strings), counted the way frame_memory_mb counts it but without
+# building that frame: a category column costs a pointer plus its string per row
+def default_memory_mb(df):
+    total = df.index.memory_usage(deep=True) + 8 * len(df)  # float64 emissions
+    for column in ('transport_mode', 'user_id'):
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            counts = np.bincount(values.cat.codes[values.cat.codes >= 0], minlength=len(values.cat.categories))
+            sizes = np.array([sys.getsizeof(category) for category in values.cat.categories], dtype='int64')
+            total += 8 * len(values) + int(counts @ sizes)
+        else:
+            total += values.memory_usage(deep=True, index=False)
+    return total / 2 ** 20
 
-# Forecast emissions for all users combined
-def forecast_emissions(df, days=7):
+# Print a compact frame's memory next to what the default layout would take
+def report_compact_memory(df):
+    print(f"Emission frame memory: {default_memory_mb(df):.2f} MB -> {frame_memory_mb(df):.2f} MB (compact)")
+
+# Convert a loaded frame to the compact representation, reporting memory before and after
+def compact_frame(df, report=True):
+    before = frame_memory_mb(df)
+    compact = df.astype({'emission_kg': 'float32', 'transport_mode': 'category', 'user_id': 'category'})
+    compact.index = compact.index.as_unit('ns')
+    if report:
+        print(f"Emission frame memory: {before:.2f} MB -> {frame_memory_mb(compact):.2f} MB (compact)")
+    return compact
+
+# Month partitions written by partitions.update_partitions: <dir>/<YYYY-MM>.parquet,
+# each sorted by datetime so row-group statistics prune within a month too
+PARTITION_DIR = 'data/partitions'
+
+def partition_months(partition_dir):
+    if not os.path.isdir(partition_dir):
+        return []
+    return sorted(name[:-len('.parquet')] for name in os.listdir(partition_dir) if name.endswith('.parquet'))
+
+# Trips in an inclusive date range and set of modes, read from the month
+# partitions in parallel. Only the months overlapping the range are opened and
+# the range and mode filters are pushed down to the Parquet reader, so the cost
+# follows the span selected rather than the length of the history.
+@profiled()
+def query_emissions(partition_dir=PARTITION_DIR, start=None, end=None, modes=None, max_workers=None, compact=False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def utc_day(value):
+        value = pd.Timestamp(value)
+        return (value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')).floor('D')
+
+    start = utc_day(start) if start is not None else None
+    end = utc_day(end) + pd.Timedelta(days=1) if end is not None else None
+    months = [
+        month for month in partition_months(partition_dir)
+        if (start is None or month >= start.strftime('%Y-%m')) and (end is None or month <= end.strftime('%Y-%m'))
+    ]
+
+    filters = []
+    if start is not None:
+        filters.append(('datetime', '>=', start))
+    if end is not None:
+        filters.append(('datetime', '<', end))
+    if modes is not None:
+        modes = list(modes)
+        filters.append(('transport_mode', 'in', modes))
+    if modes == []:
+        # No mode selected (every mode cleared in the dashboard) selects no trips;
+        # Arrow cannot type an empty 'in' list, so nothing is read
+        months = []
+
+    def read(month):
+        return pq.read_table(os.path.join(partition_dir, f"{month}.parquet"), filters=filters or None, memory_map=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        tables = list(pool.map(read, months))
+    if tables:
+        df = pa.concat_tables(tables).to_pandas().set_index('datetime')
+    else:
+        df = pd.DataFrame({
+            'emission_kg': pd.Series(dtype='float64'),
+            'transport_mode': pd.Series(dtype='object'),
+            'user_id': pd.Series(dtype='object')
+        }, index=pd.DatetimeIndex([], tz='UTC', name='datetime'))
+    return compact_frame(df, report=False) if compact else df
+
+
+# Daily totals in the ds/y shape Prophet expects
+def prophet_history(df):
     df_daily = df[['emission_kg']].resample('D').sum().reset_index()
     df_daily['datetime'] = df_daily['datetime'].dt.tz_localize(None)  # Remove timezone for Prophet
     df_daily.columns = ['ds', 'y']
+    return df_daily
+
+# Forecast emissions for all users combined
+@profiled()
+def forecast_emissions(df, days=7):
+    from prophet import Prophet
+    df_daily = prophet_history(df)
 
     model = Prophet()
     model.fit(df_daily)
@@ -51,9 +194,214 @@ def forecast_emissions(df, days=7):
     forecast = model.predict(future)
     return model, forecast
 
-# Detect anomalies in daily emission totals
-def detect_anomalies(df):
+# Worker-side fit for one group's series; must stay at module level to be picklable
+def _forecast_group(df_group, days):
+    _, forecast = forecast_emissions(df_group, days=days)
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+def _forecast_worker(conn, df_group, days):
+    try:
+        conn.send(('ok', _forecast_group(df_group, days)))
+    except Exception as exc:
+        conn.send(('error', str(exc)))
+    finally:
+        conn.close()
+
+# Forecast each value of group_key separately (e.g. per user or per mode), one
+# worker process per series with at most max_workers running at once; returns
+# one long frame with a group_key column. Series that fail to fit are skipped,
+# as are series still running timeout seconds after their own worker started:
+# that worker is terminated and its slot goes to the next series.
+@profiled()
+def forecast_emissions_by_group(df, group_key, days=7, max_workers=None, timeout=None):
+    groups = {
+        key: group[['emission_kg']].resample('D').sum().rename_axis('datetime')
+        for key, group in df.groupby(group_key, observed=True)
+    }
+
+    # Imported once here so forked workers inherit it instead of each paying
+    # the import (about a second) again
+    import prophet  # noqa: F401
+
+    ctx = multiprocessing.get_context()
+    max_workers = max_workers or os.cpu_count() or 1
+    pending = list(groups.items())
+    running = {}  # key -> (process, connection, start time)
+    results = {}
+    try:
+        while pending or running:
+            while pending and len(running) < max_workers:
+                key, daily = pending.pop(0)
+                receiver, sender = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_forecast_worker, args=(sender, daily, days), daemon=True)
+                process.start()
+                sender.close()
+                running[key] = (process, receiver, time.monotonic())
+
+            wait_for = None
+            if timeout is not None:
+                next_deadline = min(started for _, _, started in running.values()) + timeout
+                wait_for = max(0.0, next_deadline - time.monotonic())
+            ready = multiprocessing.connection.wait([conn for _, conn, _ in running.values()], timeout=wait_for)
+
+            now = time.monotonic()
+            for key, (process, conn, started) in list(running.items()):
+                if conn in ready:
+                    try:
+                        status, value = conn.recv()
+                    except EOFError:
+                        status, value = 'error', f"worker exited with code {process.exitcode}"
+                    process.join()
+                    if status == 'ok':
+                        results[key] = value
+                    else:
+                        print(f"Skipped forecast for {group_key}={key}: {value}")
+                elif timeout is not None and now - started >= timeout:
+                    process.terminate()
+                    process.join()
+                    print(f"Skipped forecast for {group_key}={key}: timed out after {timeout}s")
+                else:
+                    continue
+                conn.close()
+                del running[key]
+    finally:
+        for process, conn, _ in running.values():
+            process.terminate()
+            process.join()
+            conn.close()
+
+    frames = [results[key].assign(**{group_key: key}) for key in groups if key in results]
+    columns = [group_key, 'ds', 'yhat', 'yhat_lower', 'yhat_upper']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+# Anomaly engines label each daily total 1 (normal) or -1 (anomaly)
+class AnomalyDetector:
+    def fit_predict(self, df_daily):
+        raise NotImplementedError
+
+# Batch engine: refits a 100-tree IsolationForest over the whole series
+class IsolationForestDetector(AnomalyDetector):
+    def __init__(self, contamination=0.1, random_state=42):
+        self.contamination = contamination
+        self.random_state = random_state
+
+    def fit_predict(self, df_daily):
+        from sklearn.ensemble import IsolationForest
+        model = IsolationForest(contamination=self.contamination, random_state=self.random_state)
+        return model.fit_predict(df_daily[['emission_kg']])
+
+DETECTOR_DIR = 'data/models'
+
+
+# Online engine: EWMA control chart with O(1) time and memory per new day.
+# A day is anomalous when it falls more than `threshold` EW standard deviations
+# from the EW mean of the days before it; outliers are clipped to the control
+# limit before being folded in so one spike does not mask the next. The standard
+# deviation is floored at min_rel_std times the mean, so a flat series does not
+# turn rounding noise into anomalies.
+#
+# With a name the state is kept in state_dir and fit_predict folds in only the
+# days after the ones seen by the previous call. The last day of a series may
+# still be filling up, so it is labelled but left out of the saved state.
+class EWMADetector(AnomalyDetector):
+    def __init__(self, alpha=0.3, threshold=3.0, warmup=7, min_rel_std=0.01, name=None, state_dir=DETECTOR_DIR):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_rel_std = min_rel_std
+        self.path = os.path.join(state_dir, f"ewma_{name}.json") if name else None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return 1
+
+        limit = self.threshold * max(self.var ** 0.5, self.min_rel_std * abs(self.mean))
+        deviation = value - self.mean
+        label = -1 if self.count > self.warmup and abs(deviation) > limit else 1
+        if label == -1:
+            deviation = limit if deviation > 0 else -limit
+
+        self.mean += self.alpha * deviation
+        self.var = (1 - self.alpha) * (self.var + self.alpha * deviation ** 2)
+        return label
+
+    def fit_predict(self, df_daily):
+        values = df_daily['emission_kg'].to_numpy(dtype='float64')
+        labels = np.ones(len(values), dtype='int64')
+        start = self._resume(df_daily.index, values, labels)
+        settled = len(values) - 1
+        for i in range(start, settled):
+            labels[i] = self.update(values[i])
+        if self.path and self.count > start:
+            self._save(df_daily.index, values, labels)
+        if settled >= start:
+            labels[settled] = self.update(values[settled])
+        return labels
+
+    # Detector state, so a long-running process can resume where it left off
+    def state(self):
+        return {'count': self.count, 'mean': self.mean, 'var': self.var}
+
+    def load_state(self, state):
+        self.count, self.mean, self.var = state['count'], state['mean'], state['var']
+
+    def _config(self):
+        return [self.alpha, self.threshold, self.warmup, self.min_rel_std]
+
+    # Load the saved state when it describes the start of this series (same
+    # first day, same value on the last day it saw) and fill in the labels of
+    # the days it covers; returns the position of the first day still to fold in
+    def _resume(self, index, values, labels):
+        self.reset()
+        if not self.path or not os.path.exists(self.path) or not len(values):
+            return 0
+        with open(self.path) as f:
+            saved = json.load(f)
+        last = saved['count'] - 1  # daily series are contiguous from the first day
+        if saved['config'] != self._config() or saved['first_day'] != index[0].strftime('%Y-%m-%d') \
+                or last >= len(values) or index[last].strftime('%Y-%m-%d') != saved['last_day'] \
+                or not math.isclose(values[last], saved['last_value'], rel_tol=1e-9, abs_tol=1e-12):
+            return 0
+        self.load_state(saved)
+        labels[saved['anomalies']] = -1
+        return self.count
+
+    def _save(self, index, values, labels):
+        last = self.count - 1
+        saved = dict(self.state(), config=self._config(), first_day=index[0].strftime('%Y-%m-%d'),
+                     last_day=index[last].strftime('%Y-%m-%d'), last_value=float(values[last]),
+                     anomalies=np.flatnonzero(labels[:self.count] == -1).tolist())
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory or '.', exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory or '.', suffix='.tmp', delete=False) as f:
+            json.dump(saved, f, indent=4)
+        os.replace(f.name, self.path)
+
+
+ANOMALY_ENGINES = {
+    'isolation_forest': IsolationForestDetector,
+    'ewma': EWMADetector
+}
+
+# Detect anomalies in daily emission totals; engine is a name from
+# ANOMALY_ENGINES or an AnomalyDetector instance. name keeps the EWMA state on
+# disk under that name, so the next call only folds in the newer days.
+@profiled()
+def detect_anomalies(df, engine='isolation_forest', name=None):
     df_daily = df[['emission_kg']].resample('D').sum()
-    model = IsolationForest(contamination=0.1, random_state=42)
-    df_daily['anomaly'] = model.fit_predict(df_daily[['emission_kg']])
+    if engine == 'ewma':
+        detector = EWMADetector(name=name)
+    else:
+        detector = ANOMALY_ENGINES[engine]() if isinstance(engine, str) else engine
+    df_daily['anomaly'] = detector.fit_predict(df_daily)
     return df_daily
@@ -0,0 +1,201 @@
+# trip_store.py (Append-only JSONL storage for collected trips)
+
+import json
+import os
+
+DEFAULT_STORE = 'data/trips.jsonl'
+LEGACY_FILE = 'data/data.json'
+
+
+# Buffered writer: one JSON object per line, appended in batches
+class TripStore:
+    def __init__(self, path=DEFAULT_STORE, batch_size=100, fsync=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self._buffer = []
+
+    def append(self, entry):
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = ''.join(_encode(entry) for entry in self._buffer)
+        drop_torn_tail(self.path)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self):
+        self.flush()
+        return iter_trips(self.path)
+
+
+def _encode(entry):
+    return json.dumps(entry, separators=(',', ':')) + '\n'
+
+
+# Cut a partial last line (left by a crash mid-write) back to the last newline,
+# so the next append starts on a line of its own; returns the bytes dropped
+def drop_torn_tail(path, chunk_bytes=1 << 16):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_bytes)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+        return size - end
+
+
+# Stream trips one line at a time; a torn last line (crash mid-write) is ignored
+def iter_trips(path=DEFAULT_STORE):
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# Read the complete lines appended after a byte offset; returns the entries
+# and the offset just past the last complete line
+def read_since(path=DEFAULT_STORE, offset=0):
+    entries = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries, offset
+
+
+# Stream the entries of a legacy JSON array file without loading the whole
+# document; only about chunk_bytes of text are held at a time
+def iter_json_array(path=LEGACY_FILE, chunk_bytes=1 << 20):
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buf, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            data = f.read(chunk_bytes)
+            eof = not data
+            buf, pos = buf[pos:] + data, 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        skip(' \t\r\n')
+        if pos == len(buf):
+            return
+        if buf[pos] != '[':
+            # A single object rather than a list
+            yield json.loads(buf[pos:] + f.read())
+            return
+        pos += 1
+
+        while True:
+            skip(' \t\r\n,')
+            if pos == len(buf):
+                raise ValueError(f"Unterminated JSON array in {path}")
+            if buf[pos] == ']':
+                return
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            yield entry
+            pos = end
+
+
+# Stream trips in lists of at most batch_size entries, from a JSONL store or a JSON array
+def iter_batches(path=DEFAULT_STORE, batch_size=10_000):
+    batch = []
+    entries = iter_trips(path) if path.endswith('.jsonl') else iter_json_array(path)
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# One-shot conversion of the legacy data.json array into a JSONL store
+def migrate_json_array(src=LEGACY_FILE, dest=DEFAULT_STORE, fsync=True):
+    with open(src) as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        data = [data]
+
+    directory = os.path.dirname(dest)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = dest + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in data:
+            f.write(_encode(entry))
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, dest)
+    return len(data)
+
+
+# Migrate the legacy file the first time the store is used
+def ensure_store(path=DEFAULT_STORE, legacy_file=LEGACY_FILE):
+    if not os.path.exists(path) and os.path.exists(legacy_file):
+        migrate_json_array(legacy_file, path)
+    return path
+
+
+# Prefer the JSONL store, fall back to the legacy array file
+def resolve_data_file(path=DEFAULT_STORE, legacy_file=LEGACY_FILE):
+    return path if os.path.exists(path) else legacy_file
@@ -1,20 +1,34 @@
 # visualize.py
+#
+# matplotlib, Plotly and Prophet's plotting helpers are imported on first use,
+# so importing this module costs nothing until a chart is drawn.
 
-import matplotlib.pyplot as plt
-from prophet.plot import plot_plotly
-import plotly.io as pio
+from profiling import profiled
 
-# For saving plotly plots as PNG
-pio.kaleido.scope.default_format = "png"
+_kaleido_configured = False
 
+
+# Configure Kaleido once, the first time a Plotly figure is saved
+def _plotly_png():
+    global _kaleido_configured
+    if not _kaleido_configured:
+        import plotly.io as pio
+        pio.kaleido.scope.default_format = "png"  # For saving plotly plots as PNG
+        _kaleido_configured = True
+
+@profiled()
 def plot_forecast(model, forecast, save_path=None):
+    from prophet.plot import plot_plotly
+    _plotly_png()
     fig = plot_plotly(model, forecast)
     if save_path:
         fig.write_image(save_path)  # Save to file
     else:
         fig.show()
 
+@profiled()
 def plot_anomalies(df_anomalies, save_path=None):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10,5))
     normal = df_anomalies[df_anomalies['anomaly'] == 1]
     anomalies = df_anomalies[df_anomalies['anomaly'] == -1]
@@ -29,3 +43,35 @@ def plot_anomalies(df_anomalies, save_path=None):
     else:
         plt.show()
 
+
+def _finish(save_path):
+    import matplotlib.pyplot as plt
+    plt.tight_layout()
+    if save_path:
+        plt.savefig(save_path)
+        plt.close()
+    else:
+        plt.show()
+
+@profiled()
+def plot_emissions_by_mode(emissions_by_mode, save_path=None):
+    import matplotlib.pyplot as plt
+    emissions_by_mode.plot(kind='bar', title='Total Emissions by Transport Mode', figsize=(8,5))
+    plt.ylabel('Emissions (kg CO2)')
+    plt.xlabel('Transport Mode')
+    _finish(save_path)
+
+@profiled()
+def plot_daily_emissions_stacked(daily_mode, save_path=None):
+    import matplotlib.pyplot as plt
+    daily_mode.plot(kind='bar', stacked=True, figsize=(12,6), title='Daily Emissions by Transport Mode')
+    plt.ylabel('Emissions (kg CO2)')
+    _finish(save_path)
+
+@profiled()
+def plot_emissions_by_user(emissions_by_user, save_path=None):
+    import matplotlib.pyplot as plt
+    emissions_by_user.plot(kind='bar', title='Total Emissions by User', figsize=(8,5), color='green')
+    plt.ylabel('Emissions (kg CO2)')
+    plt.xlabel('User ID')
+    _finish(save_path)